@@ -1,25 +1,39 @@
-from fastapi import APIRouter, Depends, status, HTTPException, Response
-from fastapi.concurrency import run_in_threadpool
+from fastapi import APIRouter, Depends, Header, Query, status, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from bson import ObjectId
+from typing import List, Optional
 from datetime import datetime, timezone
 
 from app.db.session import get_database
 from app.schemas.user import UserResponse
 from app.schemas.appointment import (
     AppointmentCreate,
+    AppointmentExpandedResponse,
     AppointmentResponse,
     AppointmentWithUserResponse,
 )
-from app.crud import crud_appointment, crud_business
+from app.crud import crud_appointment, crud_business, crud_email_outbox
+from app.crud.crud_slot_counter import SlotFullError
 from app.core.security import get_current_user
-from app.services.notification_service import (
-    send_confirmation_email,
-    send_cancellation_email,
-    generate_appointment_pdf_as_bytes,
-    generate_qr_code_as_bytes,
+from app.core.serialization import MongoJSONResponse, dumps
+from app.services import appointment_export
+from app.services.email_dispatcher import notify_dispatcher
+from app.services.render_cache import etag, etag_matches, pdf_key, qr_key
+from app.services.render_pool import (
+    render_appointment_pdf,
+    render_appointments_batch_pdf,
+    render_qr_png,
 )
 
+# Comprobantes personales: el navegador los guarda pero revalida con ETag.
+RECEIPT_CACHE_CONTROL = "private, no-cache"
+
+# Tope por página del listado de citas del negocio; sin `limit` se devuelve la primera página completa.
+MAX_APPOINTMENTS_PAGE = 1000
+# Igual para "mis citas" (antes se cortaba en silencio en 200).
+MAX_MY_APPOINTMENTS_PAGE = 200
+
 router = APIRouter()
 
 @router.post("/", response_model=AppointmentResponse, status_code=status.HTTP_201_CREATED)
@@ -28,17 +42,26 @@ async def create_appointment(
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: UserResponse = Depends(get_current_user),
 ):
-    appt = await crud_appointment.create(
-        db=db,
-        business_id=appointment_in.business_id,
-        user_id=current_user.id,
-        appointment_time=appointment_in.appointment_time,
-        employee_id=appointment_in.employee_id,
-    )
+    if not ObjectId.is_valid(appointment_in.business_id):
+        raise HTTPException(status_code=400, detail="ID de negocio inválido")
+    if appointment_in.employee_id and not ObjectId.is_valid(appointment_in.employee_id):
+        raise HTTPException(status_code=400, detail="ID de empleado inválido")
+    try:
+        appt = await crud_appointment.create(
+            db=db,
+            business_id=appointment_in.business_id,
+            user_id=current_user.id,
+            appointment_time=appointment_in.appointment_time,
+            employee_id=appointment_in.employee_id,
+        )
+    except SlotFullError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return AppointmentResponse.model_validate(appt)
 
 
-@router.post("/{appointment_id}/send-pdf", status_code=status.HTTP_200_OK)
+@router.post("/{appointment_id}/send-pdf", status_code=status.HTTP_202_ACCEPTED)
 async def send_appointment_pdf_email(
     appointment_id: str,
     db: AsyncIOMotorDatabase = Depends(get_database),
@@ -59,26 +82,16 @@ async def send_appointment_pdf_email(
         "status": appointment.get("status", "confirmed"),
     }
 
-    qr_png = generate_qr_code_as_bytes(appointment_id).getvalue()
-    pdf_bytes = generate_appointment_pdf_as_bytes(
-        {**details, "qr_png": qr_png},
-        cancelled=(appointment.get("status") == "cancelled"),
-    )
-
-    success = await run_in_threadpool(
-        send_confirmation_email,
-        user_email=current_user.email,
-        details=details,
-        pdf_bytes=pdf_bytes,
-    )
-    if not success:
-        raise HTTPException(status_code=500, detail="No se pudo enviar el correo.")
-    return {"message": "Correo enviado con éxito."}
+    kind = "cancellation" if appointment.get("status") == "cancelled" else "confirmation"
+    await crud_email_outbox.enqueue(db, kind=kind, to=current_user.email, details=details)
+    notify_dispatcher()
+    return {"message": "Correo en cola de envío."}
 
 
 @router.get("/{appointment_id}/pdf")
 async def get_appointment_pdf(
     appointment_id: str,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: UserResponse = Depends(get_current_user),
 ):
@@ -97,54 +110,238 @@ async def get_appointment_pdf(
         "status": appointment.get("status", "confirmed"),
     }
 
-    qr_png = generate_qr_code_as_bytes(appointment_id).getvalue()
-    pdf_bytes = generate_appointment_pdf_as_bytes(
-        {**details, "qr_png": qr_png},
-        cancelled=(appointment.get("status") == "cancelled"),
-    )
+    cancelled = appointment.get("status") == "cancelled"
+    key = pdf_key(details, cancelled)
+    headers = {"ETag": etag(key), "Cache-Control": RECEIPT_CACHE_CONTROL}
+    if etag_matches(if_none_match, key):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    pdf_bytes, _ = await render_appointment_pdf(details, cancelled=cancelled)
 
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'inline; filename="cita_{appointment_id}.pdf"'},
+        headers={**headers, "Content-Disposition": f'inline; filename="cita_{appointment_id}.pdf"'},
     )
 
 
 @router.get("/{appointment_id}/qr")
 async def get_appointment_qr(
     appointment_id: str,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: UserResponse = Depends(get_current_user),
 ):
     appointment = await crud_appointment.get_appointment_by_id(db, appointment_id, current_user.id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Cita no encontrada o no te pertenece.")
-    qr_buffer = generate_qr_code_as_bytes(appointment_id)
-    return Response(content=qr_buffer.getvalue(), media_type="image/png")
+    key = qr_key(appointment_id)
+    headers = {"ETag": etag(key), "Cache-Control": RECEIPT_CACHE_CONTROL}
+    if etag_matches(if_none_match, key):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    qr_png, _ = await render_qr_png(appointment_id)
+    return Response(content=qr_png, media_type="image/png", headers=headers)
 
 
-@router.get("/me", response_model=List[AppointmentResponse])
+@router.get("/me", response_model=List[AppointmentExpandedResponse])
 async def get_my_appointments(
+    limit: int = Query(MAX_MY_APPOINTMENTS_PAGE, ge=1, le=MAX_MY_APPOINTMENTS_PAGE),
+    cursor: Optional[str] = None,
+    when: Optional[str] = Query(None, pattern="^(upcoming|past)$"),
+    expand: Optional[str] = Query(None, description="business,employee"),
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: UserResponse = Depends(get_current_user),
 ):
-    appointments = await crud_appointment.get_appointments_by_user_id(db, user_id=current_user.id)
-    return [AppointmentResponse.model_validate(app) for app in appointments]
+    """
+    Citas del usuario actual. Con expand=business,employee cada cita trae el
+    nombre/dirección del negocio y el nombre del empleado, sin que el cliente
+    tenga que bajar el catálogo. Sin `when` se listan de la más reciente hacia
+    atrás. El cursor de la siguiente página va en X-Next-Cursor.
+    """
+    fields = [f.strip() for f in expand.split(",") if f.strip()] if expand else []
+    unknown = [f for f in fields if f not in crud_appointment.USER_EXPANSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"expand no soportado: {', '.join(unknown)}")
+    try:
+        page, next_cursor = await crud_appointment.get_user_appointments_page(
+            db, str(current_user.id), limit=limit, cursor=cursor, when=when, expand=list(dict.fromkeys(fields))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for doc in page:
+        _listing_doc(doc, with_users=False)
+        for field in fields:
+            doc.setdefault(field, None)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return MongoJSONResponse(page, headers=headers)
+
+
+def _listing_doc(doc: dict, with_users: bool) -> dict:
+    """Completa los valores por defecto de AppointmentResponse sobre el documento crudo."""
+    doc.setdefault("status", "confirmed")
+    doc.setdefault("employee_id", None)
+    if with_users:
+        doc.setdefault("user", None)
+    return doc
+
+
+async def _list_business_appointments(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    *,
+    with_users: bool,
+    limit: int,
+    cursor: Optional[str],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    status_filter: Optional[str],
+    stream: bool,
+):
+    """
+    Listado de citas del negocio. En modo stream responde NDJSON (una cita
+    por línea) a medida que llegan del cursor; si no, devuelve una página y
+    el cursor de la siguiente en el header X-Next-Cursor.
+    """
+    if not ObjectId.is_valid(business_id):
+        raise HTTPException(status_code=400, detail="ID de negocio inválido.")
+    filters = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "statuses": [s.strip() for s in status_filter.split(",") if s.strip()] if status_filter else None,
+        "with_users": with_users,
+    }
+    try:
+        if stream:
+            docs = crud_appointment.stream_business_appointments(db, business_id, cursor=cursor, **filters)
+        else:
+            page, next_cursor = await crud_appointment.get_business_appointments_page(
+                db, business_id, limit=limit, cursor=cursor, **filters
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        async def lines():
+            async for doc in docs:
+                yield dumps(_listing_doc(doc, with_users)) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return MongoJSONResponse([_listing_doc(a, with_users) for a in page], headers=headers)
 
 
 @router.get("/business/{business_id}", response_model=List[AppointmentResponse])
-async def get_business_appointments(business_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
-    apps = await crud_appointment.get_appointments_by_business_id(db, business_id=business_id)
-    return [AppointmentResponse.model_validate(app) for app in apps]
+async def get_business_appointments(
+    business_id: str,
+    limit: int = Query(MAX_APPOINTMENTS_PAGE, ge=1, le=MAX_APPOINTMENTS_PAGE),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status_filter: Optional[str] = Query(None, alias="status", description="estados separados por coma"),
+    stream: bool = False,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    return await _list_business_appointments(
+        db, business_id,
+        with_users=False, limit=limit, cursor=cursor, date_from=date_from, date_to=date_to,
+        status_filter=status_filter, stream=stream,
+    )
 
 
 @router.get("/business/{business_id}/with-users", response_model=List[AppointmentWithUserResponse])
 async def get_business_appointments_with_users(
     business_id: str,
+    limit: int = Query(MAX_APPOINTMENTS_PAGE, ge=1, le=MAX_APPOINTMENTS_PAGE),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status_filter: Optional[str] = Query(None, alias="status", description="estados separados por coma"),
+    stream: bool = False,
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
-    appts = await crud_appointment.get_business_appointments_with_users(db, business_id)
-    return [AppointmentWithUserResponse.model_validate(a) for a in appts]
+    return await _list_business_appointments(
+        db, business_id,
+        with_users=True, limit=limit, cursor=cursor, date_from=date_from, date_to=date_to,
+        status_filter=status_filter, stream=stream,
+    )
+
+
+async def _get_owned_business(db: AsyncIOMotorDatabase, business_id: str, current_user: UserResponse) -> dict:
+    """Negocio del dueño actual (o cualquiera si es admin); 404/403 si no corresponde."""
+    business = await crud_business.get_business(db, business_id)
+    if not business:
+        raise HTTPException(status_code=404, detail="Negocio no encontrado")
+    if str(business.get("owner_id")) != str(current_user.id) and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="No tienes permiso para ver esta agenda.")
+    return business
+
+
+@router.get("/business/{business_id}/export")
+async def export_business_appointments(
+    business_id: str,
+    format: str = Query("csv", pattern="^(csv|ics)$"),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Descarga las citas del negocio (con cliente y empleado) en CSV o ICS.
+    Se transmite directamente desde el cursor, sin armar la lista en memoria.
+    """
+    business = await _get_owned_business(db, business_id, current_user)
+    docs = crud_appointment.stream_business_appointments(
+        db, business_id, date_from=date_from, date_to=date_to, with_users=True, with_employees=True
+    )
+    if format == "ics":
+        body, media_type = appointment_export.ics_lines(docs, business), "text/calendar; charset=utf-8"
+    else:
+        body, media_type = appointment_export.csv_lines(docs), "text/csv; charset=utf-8"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="citas_{business_id}.{format}"'},
+    )
+
+
+@router.get("/business/{business_id}/agenda.pdf")
+async def get_business_agenda_pdf(
+    business_id: str,
+    date: str,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Comprobantes de todas las citas de un día del negocio en un único PDF (para imprimir la agenda)."""
+    business = await _get_owned_business(db, business_id, current_user)
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD.")
+
+    appts = await crud_appointment.get_business_day_agenda(db, business_id, day)
+    if not appts:
+        raise HTTPException(status_code=404, detail="No hay citas para ese día.")
+
+    items = []
+    for a in appts:
+        user = a.get("user") or {}
+        items.append({
+            "id": str(a["_id"]),
+            "user_name": user.get("full_name") or user.get("email") or "",
+            "business_name": business.get("name"),
+            "date": a["appointment_time"].strftime("%d/%m/%Y"),
+            "time": a["appointment_time"].strftime("%H:%M"),
+            "address": business.get("address"),
+            "status": a.get("status", "confirmed"),
+        })
+    pdf_bytes = await render_appointments_batch_pdf(items)
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="agenda_{date}.pdf"'},
+    )
 
 
 @router.post("/{appointment_id}/cancel", response_model=AppointmentResponse)
@@ -181,14 +378,13 @@ async def cancel_my_appointment(
         "address": business.get("address"),
         "status": "cancelled",
     }
-    qr_png = generate_qr_code_as_bytes(appointment_id).getvalue()
-    pdf_bytes = generate_appointment_pdf_as_bytes({**details, "qr_png": qr_png}, cancelled=True)
-    await run_in_threadpool(send_cancellation_email, user_email=current_user.email, details=details, pdf_bytes=pdf_bytes)
+    await crud_email_outbox.enqueue(db, kind="cancellation", to=current_user.email, details=details)
+    notify_dispatcher()
 
     return AppointmentResponse.model_validate(appt)
 
 
-@router.post("/{appointment_id}/send-cancellation-email", status_code=status.HTTP_200_OK)
+@router.post("/{appointment_id}/send-cancellation-email", status_code=status.HTTP_202_ACCEPTED)
 async def resend_cancellation_email(
     appointment_id: str,
     db: AsyncIOMotorDatabase = Depends(get_database),
@@ -210,10 +406,6 @@ async def resend_cancellation_email(
         "address": business.get("address"),
         "status": "cancelled",
     }
-    qr_png = generate_qr_code_as_bytes(appointment_id).getvalue()
-    pdf_bytes = generate_appointment_pdf_as_bytes({**details, "qr_png": qr_png}, cancelled=True)
-
-    ok = await run_in_threadpool(send_cancellation_email, user_email=current_user.email, details=details, pdf_bytes=pdf_bytes)
-    if not ok:
-        raise HTTPException(status_code=500, detail="No se pudo enviar el correo de cancelación.")
-    return {"message": "Correo de cancelación enviado."}
+    await crud_email_outbox.enqueue(db, kind="cancellation", to=current_user.email, details=details)
+    notify_dispatcher()
+    return {"message": "Correo de cancelación en cola de envío."}
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from typing import List, Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import TypeAdapter
 from bson import ObjectId
 
 from app.db.session import get_database
 from app.crud import crud_business
-from app.schemas.business import BusinessCreate, BusinessUpdate, BusinessResponse, Schedule
+from app.schemas.business import BusinessCreate, BusinessUpdate, BusinessResponse, BusinessSummary, Schedule
 from app.schemas.user import UserResponse
+from app.core import catalog_cache
 from app.core.security import get_current_user
+from app.core.serialization import dumps
 
 router = APIRouter()
 
@@ -26,18 +29,83 @@ def convert_business_to_response(business: Dict[str, Any]) -> Dict[str, Any]:
         "appointment_mode": business.get("appointment_mode", "generico"),
     }
 
+def convert_business_to_summary(business: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(business["_id"]),
+        "name": business.get("name"),
+        "description": business.get("description"),
+        "address": business.get("address"),
+        "logo_url": business.get("logo_url"),
+        "photos": business.get("photos", []),
+        "categories": business.get("categories", []),
+        "avg_rating": business.get("avg_rating", 0.0),
+        "reviews_count": business.get("reviews_count", 0),
+        "appointment_mode": business.get("appointment_mode", "generico"),
+    }
+
+_business_list = TypeAdapter(List[BusinessResponse])
+
+# view=summary: sin horario y con la primera foto; view=detail: BusinessResponse completo.
+VIEW_PARAM = Query("detail", pattern="^(summary|detail)$")
+
+def serialize_businesses(businesses: List[Dict[str, Any]], view: str) -> bytes:
+    """
+    JSON de la lista en una sola pasada. La vista resumida ya viene recortada
+    por la proyección y va directo a orjson; la completa se valida una única
+    vez con un TypeAdapter preconstruido (FastAPI no vuelve a validarla).
+    """
+    if view == "summary":
+        return dumps([convert_business_to_summary(b) for b in businesses])
+    return _business_list.dump_json(_business_list.validate_python([convert_business_to_response(b) for b in businesses]))
+
 @router.get("/", response_model=List[BusinessResponse])
-async def get_all_published_businesses(db: AsyncIOMotorDatabase = Depends(get_database)):
-    businesses_from_db = await crud_business.get_published_businesses(db)
-    return [convert_business_to_response(b) for b in businesses_from_db]
+async def get_all_published_businesses(
+    view: str = VIEW_PARAM,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    async def build() -> bytes:
+        businesses = await crud_business.get_published_businesses(db, crud_business.VIEW_PROJECTIONS[view])
+        return serialize_businesses(businesses, view)
+
+    snapshot = await catalog_cache.get_snapshot(catalog_cache.BUSINESSES, build, variant=view)
+    if snapshot.not_modified(if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=snapshot.headers())
+    return Response(content=snapshot.body, media_type="application/json", headers=snapshot.headers())
 
 @router.get("/my-businesses", response_model=List[BusinessResponse])
 async def get_my_businesses(
+    view: str = VIEW_PARAM,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    businesses = await crud_business.get_businesses_by_owner(db, str(current_user.id))
-    return [convert_business_to_response(b) for b in businesses]
+    businesses = await crud_business.get_businesses_by_owner(
+        db, str(current_user.id), crud_business.VIEW_PROJECTIONS[view]
+    )
+    return Response(content=serialize_businesses(businesses, view), media_type="application/json")
+
+@router.get("/search", response_model=List[BusinessSummary])
+async def search_businesses(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: str = Query("rating", pattern="^(rating|name)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Directorio de negocios publicados con búsqueda y filtros. Si hay más
+    resultados, el cursor de la siguiente página viene en X-Next-Cursor.
+    """
+    try:
+        businesses, next_cursor = await crud_business.search_published_businesses(
+            db, q=q, category=category, min_rating=min_rating, sort=sort, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=serialize_businesses(businesses, "summary"), media_type="application/json", headers=headers)
 
 @router.get("/{business_id}", response_model=BusinessResponse)
 async def get_business_by_id(business_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
@@ -114,3 +182,18 @@ async def get_available_slots(
         return slots
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{business_id}/available-slots/range", response_model=Dict[str, List[str]])
+async def get_available_slots_range(
+    business_id: str,
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    employee_id: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    if not ObjectId.is_valid(business_id):
+        raise HTTPException(status_code=400, detail="ID de negocio inválido")
+    try:
+        return await crud_business.get_available_slots_for_range(db, business_id, date_from, date_to, employee_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
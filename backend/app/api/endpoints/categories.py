@@ -1,12 +1,14 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import TypeAdapter
 
 from app.db.session import get_database
 from app.crud import crud_category
 from app.schemas.category import CategoryCreate, Category
 from app.schemas.user import UserResponse
+from app.core import catalog_cache
 from app.core.security import get_current_admin_user
 
 router = APIRouter()
@@ -27,7 +29,18 @@ async def create_category(
     category = await crud_category.create_category(db, category=category_in)
     return Category.model_validate(category)
 
+_category_list = TypeAdapter(List[Category])
+
 @router.get("/", response_model=List[Category])
-async def get_all_categories(db: AsyncIOMotorDatabase = Depends(get_database)):
-    categories = await crud_category.get_all_categories(db)
-    return [Category.model_validate(cat) for cat in categories]
\ No newline at end of file
+async def get_all_categories(
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    async def build() -> bytes:
+        categories = await crud_category.get_all_categories(db)
+        return _category_list.dump_json([Category.model_validate(cat) for cat in categories], by_alias=True)
+
+    snapshot = await catalog_cache.get_snapshot(catalog_cache.CATEGORIES, build)
+    if snapshot.not_modified(if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=snapshot.headers())
+    return Response(content=snapshot.body, media_type="application/json", headers=snapshot.headers())
\ No newline at end of file
@@ -4,18 +4,21 @@ from bson import ObjectId
 from typing import List, Dict, Any, Optional
 
 from app.db.session import get_database
+from app.core.serialization import MongoJSONResponse
+from app.crud import crud_employee
 
 router = APIRouter()
 
-def _oid(id_str: str) -> ObjectId:
+def _valid_id(id_str: str) -> str:
     if not ObjectId.is_valid(id_str):
         raise HTTPException(status_code=400, detail="ID inválido")
-    return ObjectId(id_str)
+    return id_str
 
 def _employee_to_response(doc: Dict[str, Any]) -> Dict[str, Any]:
+    # los ObjectId los serializa MongoJSONResponse
     return {
-        "id": str(doc.get("_id")),
-        "business_id": str(doc.get("business_id")) if isinstance(doc.get("business_id"), ObjectId) else doc.get("business_id"),
+        "id": doc.get("_id"),
+        "business_id": doc.get("business_id"),
         "name": doc.get("name", ""),
         "active": bool(doc.get("active", True)),
         "allowed_slots": doc.get("allowed_slots", {}),  
@@ -26,39 +29,28 @@ async def list_employees(
     business_id: str,
     include_inactive: bool = Query(False),
     db: AsyncIOMotorDatabase = Depends(get_database),
-) -> List[Dict[str, Any]]:
-    q: Dict[str, Any] = {"business_id": _oid(business_id)}
-    if not include_inactive:
-        q["active"] = True
-    cur = db["employees"].find(q)
-    items = await cur.to_list(length=None)
-    return [_employee_to_response(x) for x in items]
+) -> MongoJSONResponse:
+    items = await crud_employee.get_employees_by_business(db, _valid_id(business_id), include_inactive=include_inactive)
+    return MongoJSONResponse([_employee_to_response(x) for x in items])
 
 @router.post("/businesses/{business_id}/employees", status_code=status.HTTP_201_CREATED)
 async def create_employee(
     business_id: str,
     payload: Dict[str, Any],
     db: AsyncIOMotorDatabase = Depends(get_database),
-) -> Dict[str, Any]:
+) -> MongoJSONResponse:
     name = (payload.get("name") or "").strip()
     if not name:
         raise HTTPException(status_code=400, detail="Nombre requerido")
-    doc = {
-        "business_id": _oid(business_id),
-        "name": name,
-        "active": bool(payload.get("active", True)),
-        "allowed_slots": {},
-    }
-    res = await db["employees"].insert_one(doc)
-    created = await db["employees"].find_one({"_id": res.inserted_id})
-    return _employee_to_response(created)
+    created = await crud_employee.create_employee(db, _valid_id(business_id), name, active=bool(payload.get("active", True)))
+    return MongoJSONResponse(_employee_to_response(created), status_code=status.HTTP_201_CREATED)
 
 @router.patch("/employees/{employee_id}")
 async def update_employee(
     employee_id: str,
     payload: Dict[str, Any],
     db: AsyncIOMotorDatabase = Depends(get_database),
-) -> Dict[str, Any]:
+) -> MongoJSONResponse:
     update: Dict[str, Any] = {}
     if "name" in payload:
         update["name"] = (payload["name"] or "").strip()
@@ -66,15 +58,14 @@ async def update_employee(
         update["active"] = bool(payload["active"])
     if not update:
         raise HTTPException(status_code=400, detail="Nada para actualizar")
-    await db["employees"].update_one({"_id": _oid(employee_id)}, {"$set": update})
-    doc = await db["employees"].find_one({"_id": _oid(employee_id)})
+    doc = await crud_employee.update_employee(db, _valid_id(employee_id), update)
     if not doc:
         raise HTTPException(status_code=404, detail="Empleado no encontrado")
-    return _employee_to_response(doc)
+    return MongoJSONResponse(_employee_to_response(doc))
 
 @router.delete("/employees/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_employee(employee_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
-    await db["employees"].delete_one({"_id": _oid(employee_id)})
+    await crud_employee.delete_employee(db, _valid_id(employee_id))
     return {}
 
 @router.put("/employees/{employee_id}/allowed-slots")
@@ -82,7 +73,7 @@ async def set_allowed_slots(
     employee_id: str,
     payload: Dict[str, Any],
     db: AsyncIOMotorDatabase = Depends(get_database),
-) -> Dict[str, Any]:
+) -> MongoJSONResponse:
     allowed_slots = payload.get("allowed_slots") or {}
     if not isinstance(allowed_slots, dict):
         raise HTTPException(status_code=400, detail="allowed_slots debe ser un objeto")
@@ -90,15 +81,14 @@ async def set_allowed_slots(
     for k, v in allowed_slots.items():
         if isinstance(v, list):
             norm[k] = [str(x) for x in v]
-    await db["employees"].update_one({"_id": _oid(employee_id)}, {"$set": {"allowed_slots": norm}})
-    doc = await db["employees"].find_one({"_id": _oid(employee_id)})
+    doc = await crud_employee.set_allowed_slots(db, _valid_id(employee_id), norm)
     if not doc:
         raise HTTPException(status_code=404, detail="Empleado no encontrado")
-    return _employee_to_response(doc)
+    return MongoJSONResponse(_employee_to_response(doc))
 
 @router.get("/employees/{employee_id}")
-async def get_employee(employee_id: str, db: AsyncIOMotorDatabase = Depends(get_database)) -> Dict[str, Any]:
-    doc = await db["employees"].find_one({"_id": _oid(employee_id)})
+async def get_employee(employee_id: str, db: AsyncIOMotorDatabase = Depends(get_database)) -> MongoJSONResponse:
+    doc = await crud_employee.get_employee(db, _valid_id(employee_id))
     if not doc:
         raise HTTPException(status_code=404, detail="Empleado no encontrado")
-    return _employee_to_response(doc)
+    return MongoJSONResponse(_employee_to_response(doc))
@@ -4,18 +4,23 @@ from __future__ import annotations
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
 from app.db.session import get_database
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_admin_user
+from app.core.serialization import MongoJSONResponse
 from app.schemas.user import UserResponse
-from app.schemas.review import ReviewCreate, ReviewUpdate, ReviewResponse
-from app.crud import crud_review, crud_appointment, crud_business
+from app.schemas.review import ReviewCreate, ReviewUpdate, ReviewResponse, ReviewWithAuthorResponse
+from app.crud import crud_review, crud_appointment, crud_business, crud_user
 
 router = APIRouter()
 
+# Tope por página; sin `limit` se devuelve la primera página completa.
+MAX_REVIEWS_PAGE = 100
+MAX_ELIGIBILITY_IDS = 100
+
 
 # ------------------------- Helpers -------------------------
 def _ensure_updated_at(docs: List[dict]) -> None:
@@ -33,14 +38,6 @@ def _as_dt(x) -> Optional[datetime]:
         return None
 
 
-def _normalize_id(x: Any) -> Optional[str]:
-    if not x:
-        return None
-    if isinstance(x, ObjectId):
-        return str(x)
-    return str(x)
-
-
 def _stringify_oid(v: Any) -> Any:
     return str(v) if isinstance(v, ObjectId) else v
 
@@ -62,15 +59,58 @@ def _normalize_review_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
 
 
 # ------------------------- Endpoints -------------------------
-@router.get("/business/{business_id}", response_model=List[ReviewResponse])
+@router.get("/business/{business_id}", response_model=List[ReviewWithAuthorResponse])
 async def list_reviews(
     business_id: str,
+    limit: int = Query(MAX_REVIEWS_PAGE, ge=1, le=MAX_REVIEWS_PAGE),
+    cursor: Optional[str] = None,
+    rating: Optional[int] = Query(None, ge=1, le=5),
+    has_reply: Optional[bool] = None,
+    expand: Optional[str] = Query(None, pattern="^author$"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Reseñas del negocio, más recientes primero. Si hay más páginas, el
+    cursor para pedir la siguiente viene en el header X-Next-Cursor.
+    Con expand=author cada reseña trae el perfil público de su autor en "author".
+    """
+    try:
+        reviews, next_cursor = await crud_review.get_reviews_page(
+            db, business_id, limit=limit, cursor=cursor, rating=rating, has_reply=has_reply
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # la proyección ya deja los campos de ReviewResponse; solo faltan los valores por defecto
+    for r in reviews:
+        r.setdefault("appointment_id", None)
+        r.setdefault("reply", None)
+        if r.get("updated_at") is None:
+            r["updated_at"] = r.get("created_at")
+    if expand == "author":
+        # una sola consulta $in para todos los autores de la página
+        users = await crud_user.get_public_users(db, [str(r.get("user_id")) for r in reviews])
+        authors = {str(u["_id"]): u for u in users}
+        for r in reviews:
+            r["author"] = authors.get(str(r.get("user_id")))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return MongoJSONResponse(reviews, headers=headers)
+
+
+@router.get("/eligibility")
+async def can_review_many(
+    business_ids: str = Query(..., description="ids de negocio separados por coma"),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: UserResponse = Depends(get_current_user),
 ):
-    reviews = await crud_review.get_reviews_by_business(db, business_id)
-    _ensure_updated_at(reviews)
-    normalized = [_normalize_review_doc(r) for r in reviews]
-    return [ReviewResponse.model_validate(r) for r in normalized]
+    """Elegibilidad para varios negocios a la vez (páginas de listado)."""
+    ids = [b.strip() for b in business_ids.split(",") if b.strip()]
+    if len(ids) > MAX_ELIGIBILITY_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_ELIGIBILITY_IDS} negocios por consulta.")
+    found = await crud_appointment.get_last_reviewable_appointments(db, current_user.id, ids)
+    return {
+        b: {"eligible": b in found, "appointment_id": found.get(b)}
+        for b in ids
+    }
 
 
 @router.get("/eligibility/{business_id}")
@@ -83,35 +123,10 @@ async def can_review(
     Elegible si el usuario tiene **alguna** cita pasada (no cancelada) con el negocio.
     Devuelve la última cita pasada para vincular la reseña.
     """
-    now = datetime.utcnow()
-    user_apps = await crud_appointment.get_appointments_by_user_id(db, current_user.id)
-
-    # Acepta business_id tanto str como ObjectId
-    try:
-        bid_oid = ObjectId(business_id)
-    except Exception:
-        bid_oid = None
-    bid_str = business_id
-
-    candidates: List[Dict[str, Any]] = []
-    for a in (user_apps or []):
-        a_bid = a.get("business_id")
-        same_business = str(a_bid) == bid_str or (bid_oid is not None and a_bid == bid_oid)
-        status = (a.get("status") or "").lower()
-        not_cancelled = status not in ("cancelled", "canceled")
-        when = _as_dt(a.get("appointment_time")) or now
-        in_past = when <= now
-        if same_business and not_cancelled and in_past:
-            candidates.append(a)
-
-    if not candidates:
+    last = await crud_appointment.get_last_reviewable_appointment(db, current_user.id, business_id)
+    if not last:
         return {"eligible": False, "appointment_id": None}
-
-    candidates.sort(key=lambda x: _as_dt(x.get("appointment_time")) or datetime.min, reverse=True)
-    last = candidates[0]
-    last_id = _normalize_id(last.get("_id") or last.get("id"))
-
-    return {"eligible": True, "appointment_id": str(last_id)}
+    return {"eligible": True, "appointment_id": str(last["_id"])}
 
 
 @router.post("/", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
@@ -128,27 +143,10 @@ async def create_review(
 
     # Si no llega appointment_id, localizamos la última cita pasada elegible
     if not appointment_id:
-        now = datetime.utcnow()
-        user_apps = await crud_appointment.get_appointments_by_user_id(db, current_user.id)
-        try:
-            bid_oid = ObjectId(payload.business_id)
-        except Exception:
-            bid_oid = None
-        bid_str = payload.business_id
-
-        candidates: List[Dict[str, Any]] = []
-        for a in (user_apps or []):
-            a_bid = a.get("business_id")
-            same_business = str(a_bid) == bid_str or (bid_oid is not None and a_bid == bid_oid)
-            status = (a.get("status") or "").lower()
-            not_cancelled = status not in ("cancelled", "canceled")
-            when = _as_dt(a.get("appointment_time")) or now
-            if same_business and not_cancelled and when <= now:
-                candidates.append(a)
-        if not candidates:
+        last = await crud_appointment.get_last_reviewable_appointment(db, current_user.id, payload.business_id)
+        if not last:
             raise HTTPException(status_code=400, detail="No pudimos validar una cita elegible para este negocio.")
-        candidates.sort(key=lambda x: _as_dt(x.get("appointment_time")) or datetime.min, reverse=True)
-        appointment_id = _normalize_id(candidates[0].get("_id"))
+        appointment_id = str(last["_id"])
 
     # Validaciones básicas
     appo = await crud_appointment.get_appointment_by_id(db, appointment_id, current_user.id)
@@ -180,9 +178,6 @@ async def create_review(
         await db["reviews"].update_one({"_id": doc["_id"]}, {"$set": {"updated_at": doc.get("created_at", now)}})
         doc["updated_at"] = doc.get("created_at", now)
 
-    # Recalcular rating del negocio
-    await crud_review.recompute_business_rating(db, payload.business_id)
-
     normalized = _normalize_review_doc(doc)
     _ensure_updated_at([normalized])
     return ReviewResponse.model_validate(normalized)
@@ -213,7 +208,6 @@ async def update_review(
         await db["reviews"].update_one({"_id": updated["_id"]}, {"$set": {"updated_at": now}})
         updated["updated_at"] = now
 
-    await crud_review.recompute_business_rating(db, str(updated["business_id"]))
     normalized = _normalize_review_doc(updated)
     _ensure_updated_at([normalized])
     return ReviewResponse.model_validate(normalized)
@@ -232,8 +226,6 @@ async def delete_review(
     deleted = await crud_review.delete_review(db, review_id, current_user.id)
     if not deleted:
         raise HTTPException(status_code=404, detail="No se pudo eliminar.")
-
-    await crud_review.recompute_business_rating(db, str(review["business_id"]))
     return {"message": "Reseña eliminada."}
 
 
@@ -277,3 +269,12 @@ async def reply_review(
     normalized = _normalize_review_doc(doc)
     _ensure_updated_at([normalized])
     return ReviewResponse.model_validate(normalized)
+
+
+@router.post("/admin/reconcile-ratings")
+async def reconcile_ratings(
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: UserResponse = Depends(get_current_admin_user),
+):
+    """Recalcula en bloque los acumulados de calificación de todos los negocios."""
+    return await crud_review.reconcile_business_ratings(db)
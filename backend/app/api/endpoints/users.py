@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
@@ -6,8 +6,12 @@ from bson import ObjectId
 from app.db.session import get_database
 from app.crud import crud_user
 from app.schemas.category import CategoryRequestSchema
-from app.schemas.user import UserCreate, UserResponse, UserUpdate, OwnerRequestSchema
-from app.core.security import get_current_user, get_current_admin_user
+from app.schemas.user import UserCreate, UserPublic, UserResponse, UserUpdate, OwnerRequestSchema
+from app.core.security import get_current_user, get_current_admin_user, auth_cache_stats
+from app.core.serialization import MongoJSONResponse
+
+# Tope de ids por consulta en /users/public.
+MAX_PUBLIC_USERS = 100
 
 router = APIRouter()
 
@@ -78,6 +82,21 @@ async def get_pending_category_requests_route(db: AsyncIOMotorDatabase = Depends
     requests = await crud_user.get_pending_category_requests(db)
     return requests
 
+@router.get("/admin/auth-cache")
+async def get_auth_cache_stats(current_user: UserResponse = Depends(get_current_admin_user)):
+    return auth_cache_stats()
+
+@router.get("/public", response_model=List[UserPublic])
+async def get_public_users(
+    ids: str = Query(..., description="ids de usuario separados por coma"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """Nombre y foto de varios usuarios a la vez; los ids que no existen no aparecen."""
+    user_ids = list(dict.fromkeys(u.strip() for u in ids.split(",") if u.strip()))
+    if len(user_ids) > MAX_PUBLIC_USERS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PUBLIC_USERS} usuarios por consulta.")
+    return MongoJSONResponse(await crud_user.get_public_users(db, user_ids))
+
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(user_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     user = await crud_user.get_user_by_id(db, user_id)
@@ -0,0 +1,76 @@
+"""
+Instantáneas en memoria del catálogo público (negocios publicados y categorías).
+
+Cada instantánea guarda el JSON ya serializado y un ETag derivado de su
+contenido, así todos los workers entregan el mismo ETag para los mismos
+datos. Las escrituras del propio worker la invalidan al instante; el TTL
+acota cuánto puede tardar en enterarse un worker que no hizo la escritura.
+"""
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+BUSINESSES = "businesses"
+CATEGORIES = "categories"
+
+# El navegador guarda la respuesta pero revalida siempre con If-None-Match.
+CATALOG_CACHE_CONTROL = "public, no-cache"
+
+
+class CatalogSnapshot(NamedTuple):
+    body: bytes
+    etag: str
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        return any(t.strip() in (self.etag, "*") for t in if_none_match.split(","))
+
+    def headers(self) -> Dict[str, str]:
+        return {"ETag": self.etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+
+
+_snapshots = TTLCache(maxsize=8, ttl=settings.CATALOG_CACHE_TTL_SECONDS)
+_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+_generation = 0
+
+
+def invalidate_catalog(kind: Optional[str] = None) -> None:
+    """Descarta la instantánea indicada (o todas) para que se reconstruya en la próxima lectura."""
+    global _generation
+    _generation += 1
+    if kind is None:
+        _snapshots.clear()
+    else:
+        _snapshots.invalidate_where(lambda key, _: key[0] == kind)
+
+
+async def get_snapshot(kind: str, build: Callable[[], Awaitable[bytes]], variant: str = "") -> CatalogSnapshot:
+    """
+    Devuelve la instantánea vigente o la construye con `build`. Las lecturas
+    concurrentes esperan a una única reconstrucción. `variant` distingue
+    representaciones del mismo catálogo (p. ej. vista resumida o completa).
+    """
+    key = (kind, variant)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+    lock = _locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is not None:
+            return snapshot
+        generation = _generation
+        body = await build()
+        snapshot = CatalogSnapshot(body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+        # si hubo una escritura mientras se construía, no guardar datos que pueden ser viejos
+        if generation == _generation:
+            _snapshots.set(key, snapshot)
+        return snapshot
+
+
+def catalog_cache_stats() -> Dict[str, int]:
+    return {**_snapshots.stats(), "generation": _generation}
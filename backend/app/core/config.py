@@ -14,6 +14,10 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     GOOGLE_CLIENT_ID: str
+    GOOGLE_USERINFO_URL: str = "https://www.googleapis.com/oauth2/v3/userinfo"
+    GOOGLE_JWKS_URL: str = "https://www.googleapis.com/oauth2/v3/certs"
+    GOOGLE_HTTP_TIMEOUT_SECONDS: float = 5.0
+    GOOGLE_TOKEN_CACHE_TTL_SECONDS: int = 300
 
     MAIL_SERVER: str
     MAIL_PORT: int
@@ -22,6 +26,37 @@ class Settings(BaseSettings):
     MAIL_DEFAULT_SENDER: Optional[str] = None
     MAIL_FROM_NAME: Optional[str] = None
 
+    # "apply" crea los índices faltantes al arrancar, "report" solo los lista, "off" no hace nada
+    INDEX_BOOTSTRAP: str = "apply"
+
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60
+
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Con False el outbox se despacha con `python -m app.services.email_dispatcher`
+    EMAIL_DISPATCHER_ENABLED: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 20
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5.0
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+
+    RENDER_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024
+    # Carpeta privada (0700) para la caché en disco; vacío = solo caché en memoria
+    RENDER_CACHE_DIR: str = ""
+    # Tope de la carpeta en disco (compartida por los workers); 0 = sin tope
+    RENDER_CACHE_DISK_BYTES: int = 256 * 1024 * 1024
+
+    RENDER_POOL_WORKERS: int = 2
+    RENDER_POOL_MAX_CONCURRENCY: int = 8
+
+    SLOT_GRID_CACHE_SIZE: int = 4096
+    SLOT_GRID_CACHE_TTL_SECONDS: int = 300
+
+    CATALOG_CACHE_TTL_SECONDS: int = 30
+
+    # Comandos de Mongo que tardan más que esto se loguean con la forma de su filtro
+    SLOW_QUERY_MS: float = 100.0
+
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
@@ -0,0 +1,345 @@
+"""
+Métricas en formato Prometheus, expuestas en GET /metrics.
+
+Con varios workers de uvicorn hay que definir PROMETHEUS_MULTIPROC_DIR
+(una carpeta vacía, limpiada en cada arranque) antes de lanzar el proceso:
+cada worker escribe sus valores ahí y /metrics devuelve la suma de todos.
+Sin esa variable las métricas son las del proceso que atiende el scrape.
+
+Los hijos de cada métrica (una combinación de labels) se crean una sola
+vez y se guardan; en cada request solo se incrementan valores.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+from app.db.monitoring import current_stats
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+UNMATCHED_ROUTE = "(sin ruta)"
+OUTBOX_STATUSES = ("pending", "sending", "sent", "dead")
+RENDER_KINDS = ("pdf", "qr", "agenda")
+
+REQUESTS = Counter("http_requests_total", "Requests HTTP atendidos.", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Duración de los requests HTTP por ruta.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Tiempo en comandos de Mongo de cada request, por ruta.",
+    ["method", "route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+IN_PROGRESS = Gauge("http_requests_in_progress", "Requests HTTP en curso.", multiprocess_mode="livesum")
+
+POOL_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Espera para obtener una conexión del pool de Mongo.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Conexiones del pool que no se pudieron obtener.", ["reason"]
+)
+
+PASSWORD_HASH_WORKERS = Gauge(
+    "password_hash_pool_workers", "Hilos del pool de bcrypt.", multiprocess_mode="livesum"
+)
+PASSWORD_HASH_QUEUED = Gauge(
+    "password_hash_pool_queued", "Operaciones bcrypt esperando un hilo libre.", multiprocess_mode="livesum"
+)
+PASSWORD_HASH_RUNNING = Gauge(
+    "password_hash_pool_running", "Operaciones bcrypt en ejecución.", multiprocess_mode="livesum"
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_pool_wait_seconds",
+    "Espera en la cola del pool de bcrypt antes de empezar a hashear/verificar.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Retraso del event loop respecto de un sleep periódico.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+OUTBOX = Gauge(
+    "email_outbox_messages", "Correos del outbox por estado.", ["status"], multiprocess_mode="mostrecent"
+)
+SMTP_LATENCY = Histogram(
+    "smtp_send_duration_seconds",
+    "Duración del envío SMTP de un correo.",
+    ["outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+RENDER_LATENCY = Histogram(
+    "render_duration_seconds",
+    "Duración del render de PDF/QR en el pool (incluye la espera en cola).",
+    ["kind"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# (método, ruta) -> (hijo de latencia, hijo de tiempo en Mongo)
+_latency: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
+_requests: Dict[Tuple[str, str, int], Any] = {}
+_smtp = {outcome: SMTP_LATENCY.labels(outcome) for outcome in ("ok", "error")}
+_render = {kind: RENDER_LATENCY.labels(kind) for kind in RENDER_KINDS}
+_outbox = {status: OUTBOX.labels(status) for status in OUTBOX_STATUSES}
+
+
+def prepare_routes(app: Any) -> None:
+    """Crea de antemano los hijos de latencia de las rutas declaradas en la app."""
+    for route in app.routes:
+        for method in getattr(route, "methods", None) or ():
+            _route_children(method, route.path)
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """
+    Plantilla completa de la ruta resuelta ("/api/reviews/business/{business_id}").
+    La ruta de un router incluido puede traer solo su parte relativa; los
+    prefijos de include_router son literales, así que se toman del path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return UNMATCHED_ROUTE
+    parts = scope["path"].split("/")
+    depth = template.count("/")
+    if depth >= len(parts):
+        return template
+    return "/".join(parts[:-depth]) + template
+
+
+def _route_children(method: str, route: str) -> Tuple[Any, Any]:
+    children = _latency.get((method, route))
+    if children is None:
+        children = _latency[(method, route)] = (
+            REQUEST_LATENCY.labels(method, route),
+            REQUEST_DB_TIME.labels(method, route),
+        )
+    return children
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, db_seconds: Optional[float] = None) -> None:
+    latency, db_time = _route_children(method, route)
+    latency.observe(seconds)
+    if db_seconds is not None:
+        db_time.observe(db_seconds)
+    counter = _requests.get((method, route, status))
+    if counter is None:
+        counter = _requests[(method, route, status)] = REQUESTS.labels(method, route, str(status))
+    counter.inc()
+
+
+@contextmanager
+def smtp_timer() -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        _smtp["error"].observe(time.perf_counter() - started)
+        raise
+    _smtp["ok"].observe(time.perf_counter() - started)
+
+
+@contextmanager
+def render_timer(kind: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _render[kind].observe(time.perf_counter() - started)
+
+
+def set_outbox_depth(counts: Dict[str, int]) -> None:
+    for status, gauge in _outbox.items():
+        gauge.set(counts.get(status, 0))
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: cuenta y cronometra cada request por plantilla de ruta.
+    Va dentro de DbTimingMiddleware para poder leer el tiempo en Mongo del request.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_PROGRESS.dec()
+            # se usa la plantilla de la ruta (no el path) para acotar los labels
+            route = route_template(scope)
+            db_stats = current_stats()
+            observe_request(
+                scope["method"], route, status, time.perf_counter() - started,
+                db_stats.total_ms / 1000 if db_stats is not None else None,
+            )
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Registra cuánto se espera por una conexión del pool de Motor."""
+
+    def __init__(self) -> None:
+        self._failures = {
+            reason: POOL_CHECKOUT_FAILURES.labels(reason)
+            for reason in ("timeout", "poolClosed", "connectionError")
+        }
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        POOL_WAIT.observe(event.duration)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        POOL_WAIT.observe(event.duration)
+        failures = self._failures.get(event.reason)
+        if failures is None:
+            failures = self._failures[event.reason] = POOL_CHECKOUT_FAILURES.labels(event.reason)
+        failures.inc()
+
+    def pool_created(self, event: Any) -> None:
+        pass
+
+    def pool_ready(self, event: Any) -> None:
+        pass
+
+    def pool_cleared(self, event: Any) -> None:
+        pass
+
+    def pool_closed(self, event: Any) -> None:
+        pass
+
+    def connection_created(self, event: Any) -> None:
+        pass
+
+    def connection_ready(self, event: Any) -> None:
+        pass
+
+    def connection_closed(self, event: Any) -> None:
+        pass
+
+    def connection_check_out_started(self, event: Any) -> None:
+        pass
+
+    def connection_checked_in(self, event: Any) -> None:
+        pass
+
+
+pool_monitor = PoolMonitor()
+
+_lag_task: Optional[asyncio.Task] = None
+
+
+async def _watch_loop_lag(interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+def start_loop_lag_monitor(interval: float = 0.5) -> None:
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_watch_loop_lag(interval))
+
+
+async def stop_loop_lag_monitor() -> None:
+    global _lag_task
+    if _lag_task is None:
+        return
+    _lag_task.cancel()
+    try:
+        await _lag_task
+    except asyncio.CancelledError:
+        pass
+    _lag_task = None
+
+
+class _CacheCollector:
+    """
+    Estadísticas de las cachés en memoria. Son de cada proceso, así que solo
+    se exportan sin multiproceso (sumarlas entre workers no tendría sentido).
+    """
+
+    def collect(self):
+        from app.core.catalog_cache import catalog_cache_stats
+        from app.core.security import auth_cache_stats
+        from app.crud.crud_business import slot_grid_stats
+        from app.services.render_cache import render_cache_stats
+
+        families: Dict[str, GaugeMetricFamily] = {}
+        sources = {
+            "auth": auth_cache_stats(),
+            "catalog": catalog_cache_stats(),
+            "render": render_cache_stats(),
+            "slot_grids": slot_grid_stats(),
+        }
+        for cache, stats in sources.items():
+            for key, value in stats.items():
+                family = families.get(key)
+                if family is None:
+                    family = families[key] = GaugeMetricFamily(
+                        f"app_cache_{key}", f"Caché en memoria: {key}.", labels=["cache"]
+                    )
+                family.add_metric([cache], value)
+        return list(families.values())
+
+
+def _registry() -> CollectorRegistry:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    REGISTRY.register(_CacheCollector())
+    return REGISTRY
+
+
+_scrape_registry: Optional[CollectorRegistry] = None
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Cuerpo y content-type de /metrics."""
+    global _scrape_registry
+    if _scrape_registry is None:
+        _scrape_registry = _registry()
+    return generate_latest(_scrape_registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """Al apagar un worker (o un proceso hijo) en multiproceso, descarta sus gauges "live"."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,115 @@
+"""
+Paginación por keyset con cursor opaco.
+
+En vez de skip/offset, cada página pide "lo que viene después del último
+documento visto" según el orden de la consulta. El cursor codifica los
+valores de ese último documento para los campos de orden (siempre
+terminando en _id para desempatar), así que el costo no crece con la página.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+
+Sort = Sequence[Tuple[str, int]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$d": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$o": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$d" in value:
+            return datetime.fromisoformat(value["$d"])
+        if "$o" in value:
+            return ObjectId(value["$o"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Lanza ValueError si el cursor no es válido para un orden de `size` campos."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except Exception:
+        raise ValueError("Cursor inválido.")
+    if len(values) != size:
+        raise ValueError("Cursor inválido.")
+    return values
+
+
+def keyset_filter(sort: Sort, values: Sequence[Any]) -> Dict[str, Any]:
+    """Condición "después de `values`" para el orden `sort`."""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause: Dict[str, Any] = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def after_cursor(query: Dict[str, Any], sort: Sort, cursor: Optional[str]) -> Dict[str, Any]:
+    """`query` restringida a lo que sigue después de `cursor` (si lo hay)."""
+    if not cursor:
+        return query
+    return {"$and": [query, keyset_filter(sort, decode_cursor(cursor, len(sort)))]}
+
+
+def _split_page(docs: List[Dict[str, Any]], sort: Sort, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor([docs[-1].get(field) for field, _ in sort])
+
+
+async def fetch_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    sort: Sort,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Devuelve (documentos, cursor_siguiente). cursor_siguiente es None en la
+    última página. `sort` debe terminar en _id para que el orden sea total.
+    """
+    query = after_cursor(query, sort, cursor)
+    docs = await collection.find(query, projection).sort(list(sort)).limit(limit + 1).to_list(length=limit + 1)
+    return _split_page(docs, sort, limit)
+
+
+async def aggregate_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    sort: Sort,
+    limit: int,
+    cursor: Optional[str] = None,
+    stages: Sequence[Dict[str, Any]] = (),
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Como fetch_page, pero aplica `stages` (p. ej. un $lookup) solo a los
+    documentos de la página, después de filtrar, ordenar y limitar.
+    """
+    pipeline = [
+        {"$match": after_cursor(query, sort, cursor)},
+        {"$sort": dict(sort)},
+        {"$limit": limit + 1},
+        *stages,
+    ]
+    docs = await collection.aggregate(pipeline).to_list(length=limit + 1)
+    return _split_page(docs, sort, limit)
@@ -1,5 +1,8 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -8,16 +11,65 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.db.session import get_database
 from app.schemas.user import UserResponse
 from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.metrics import (
+    PASSWORD_HASH_QUEUED,
+    PASSWORD_HASH_RUNNING,
+    PASSWORD_HASH_WAIT,
+    PASSWORD_HASH_WORKERS,
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/access-token")
 
+# token -> UserResponse ya validado; evita ir a Mongo en cada request autenticado
+_user_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(user_id: Optional[str] = None, email: Optional[str] = None) -> None:
+    """Descarta las entradas en caché del usuario (llamar tras cualquier cambio en su documento)."""
+    user_id = str(user_id) if user_id else None
+    _user_cache.invalidate_where(
+        lambda _, u: (user_id is not None and str(u.id) == user_id) or (email is not None and u.email == email)
+    )
+
+def auth_cache_stats() -> Dict[str, int]:
+    return _user_cache.stats()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# bcrypt tarda ~250ms por operación: se ejecuta en un pool acotado para no bloquear el event loop.
+# La cola, los hilos ocupados y la espera se exportan en /metrics (password_hash_pool_*).
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+PASSWORD_HASH_WORKERS.set(settings.PASSWORD_HASH_WORKERS)
+
+async def _run_in_hash_pool(fn: Callable[..., Any], *args: Any) -> Any:
+    submitted = time.monotonic()
+    PASSWORD_HASH_QUEUED.inc()
+
+    def job() -> Any:
+        PASSWORD_HASH_QUEUED.dec()
+        PASSWORD_HASH_WAIT.observe(time.monotonic() - submitted)
+        with PASSWORD_HASH_RUNNING.track_inprogress():
+            return fn(*args)
+
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, job)
+
+async def hash_password(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña en el pool. Si passlib indica que el hash está
+    obsoleto (needs_update) devuelve también el nuevo hash para guardarlo.
+    """
+    if not hashed_password:
+        return False, None
+    return await _run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -49,12 +101,25 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
+
+    # cada request recibe su propia copia: si un endpoint modifica el usuario,
+    # no cambia lo que ven las siguientes requests con el mismo token
+    cached = _user_cache.get(token)
+    if cached is not None:
+        return cached.model_copy(deep=True)
+
     user_data = await get_user_by_email(db, email=email)
     if user_data is None:
         raise credentials_exception
-        
-    return UserResponse.model_validate(user_data)
+
+    user = UserResponse.model_validate(user_data)
+    ttl = float(settings.AUTH_CACHE_TTL_SECONDS)
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = min(ttl, float(exp) - time.time())
+    if ttl > 0:
+        _user_cache.set(token, user.model_copy(deep=True), ttl=ttl)
+    return user
 
 def get_current_admin_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     """
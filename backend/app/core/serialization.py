@@ -0,0 +1,31 @@
+"""
+Serialización JSON rápida para documentos de Mongo.
+
+orjson ya entiende datetime; aquí se le enseña ObjectId y Decimal128 para
+poder serializar documentos de Mongo sin convertirlos antes campo por campo.
+MongoJSONResponse es la clase de respuesta por defecto de la API: un handler
+puede devolver `MongoJSONResponse(docs)` con los documentos tal como vienen
+de Motor y se saltea la validación/conversión de FastAPI.
+"""
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
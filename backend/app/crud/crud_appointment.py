@@ -1,7 +1,122 @@
-from typing import Optional, Dict, Any, List
-from motor.motor_asyncio import AsyncIOMotorDatabase
+import re
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+from motor.motor_asyncio import AsyncIOMotorCommandCursor, AsyncIOMotorDatabase
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from app.crud import crud_business, crud_slot_counter
+from app.core.pagination import after_cursor, aggregate_page, fetch_page
+from app.crud.crud_slot_counter import SlotUnavailableError
+from app.db.indexes import index
+
+INDEXES = {
+    "appointments": [
+        index(
+            [("business_id", ASCENDING), ("appointment_time", ASCENDING), ("_id", ASCENDING)],
+            "business_time_id",
+        ),
+        index(
+            [("user_id", ASCENDING), ("appointment_time", ASCENDING), ("_id", ASCENDING)],
+            "user_time_id",
+        ),
+        index(
+            [("user_id", ASCENDING), ("business_id", ASCENDING), ("appointment_time", DESCENDING)],
+            "user_business_time",
+        ),
+    ],
+}
+
+BUSINESS_LIST_SORT = [("appointment_time", ASCENDING), ("_id", ASCENDING)]
+# "Mis citas": las próximas de la más cercana en adelante, las pasadas de la más reciente hacia atrás.
+USER_LIST_SORTS = {
+    "upcoming": [("appointment_time", ASCENDING), ("_id", ASCENDING)],
+    "past": [("appointment_time", DESCENDING), ("_id", DESCENDING)],
+}
+# Campos de AppointmentResponse: los listados se devuelven tal cual salen de Mongo.
+LISTING_PROJECTION = {"business_id": 1, "user_id": 1, "appointment_time": 1, "status": 1, "employee_id": 1}
+
+# Nombre/email del cliente dentro de la misma agregación (solo para los documentos que se devuelven).
+USER_LOOKUP = [
+    {
+        "$lookup": {
+            "from": "users",
+            "let": {"uid": "$user_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$uid"]}}},
+                {"$project": {"full_name": 1, "email": 1}},
+            ],
+            "as": "user",
+        }
+    },
+    {"$set": {"user": {"$arrayElemAt": ["$user", 0]}}},
+]
+
+EMPLOYEE_LOOKUP = [
+    {
+        "$lookup": {
+            "from": "employees",
+            "let": {"eid": "$employee_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$eid"]}}},
+                {"$project": {"name": 1}},
+            ],
+            "as": "employee",
+        }
+    },
+    {"$set": {"employee": {"$arrayElemAt": ["$employee", 0]}}},
+]
+
+# Lo que la página de citas muestra del negocio; el resto se consulta al abrir el negocio.
+BUSINESS_LOOKUP = [
+    {
+        "$lookup": {
+            "from": "businesses",
+            "let": {"bid": "$business_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$bid"]}}},
+                {"$project": {"name": 1, "address": 1, "categories": 1}},
+            ],
+            "as": "business",
+        }
+    },
+    {"$set": {"business": {"$arrayElemAt": ["$business", 0]}}},
+]
+
+USER_EXPANSIONS = {"business": BUSINESS_LOOKUP, "employee": EMPLOYEE_LOOKUP}
+
+def _naive_utc(value: datetime) -> datetime:
+    """Mongo guarda las fechas en UTC sin zona horaria."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _slot_start(appointment_time: datetime) -> datetime:
+    """Normaliza la hora de la cita a como la guarda Mongo (UTC naive, sin segundos)."""
+    return _naive_utc(appointment_time).replace(second=0, microsecond=0)
+
+async def _reserve_slot(
+    db: AsyncIOMotorDatabase, business_id: str, employee_id: Optional[str], slot: datetime
+) -> None:
+    """
+    Valida la hora contra la rejilla y ocupa el turno en slot_counters:
+    siempre el contador del negocio y, con empleado, también el suyo.
+    """
+    weekday = slot.weekday()
+    business_grid = (await crud_business.get_slot_grids(db, business_id, [weekday]))[weekday]
+    grid = business_grid
+    if employee_id:
+        grid = (await crud_business.get_slot_grids(db, business_id, [weekday], employee_id))[weekday]
+    if slot.hour * 60 + slot.minute not in grid[0]:
+        raise SlotUnavailableError("El horario seleccionado no está disponible.")
+    await crud_slot_counter.reserve_booking(
+        db,
+        business_id=business_id,
+        employee_id=employee_id,
+        slot=slot,
+        capacity=business_grid[1],
+        employee_capacity=grid[1],
+    )
 
 async def create(
     db: AsyncIOMotorDatabase,
@@ -11,29 +126,105 @@ async def create(
     appointment_time: datetime,
     employee_id: Optional[str] = None,
 ):
+    """
+    Reserva el turno en slot_counters y luego inserta la cita.
+    Lanza SlotUnavailableError si la hora no es un turno del horario y
+    SlotFullError si el turno ya está completo.
+    """
+    slot = _slot_start(appointment_time)
+    await _reserve_slot(db, business_id, employee_id, slot)
+
     doc: Dict[str, Any] = {
         "business_id": ObjectId(business_id),
         "user_id": ObjectId(user_id),
-        "appointment_time": appointment_time,
+        "appointment_time": slot,
         "status": "confirmed",
         "created_at": datetime.utcnow(),
     }
     if employee_id:
         doc["employee_id"] = ObjectId(employee_id)
 
-    res = await db["appointments"].insert_one(doc)
-    return await db["appointments"].find_one({"_id": res.inserted_id})
+    try:
+        res = await db["appointments"].insert_one(doc)
+    except Exception:
+        await crud_slot_counter.release_booking(db, business_id=business_id, employee_id=employee_id, slot=slot)
+        raise
+    doc["_id"] = res.inserted_id
+    return doc
 
 async def get_appointment_by_id(db: AsyncIOMotorDatabase, appointment_id: str, user_id: str):
     if not ObjectId.is_valid(appointment_id):
         return None
     return await db["appointments"].find_one({"_id": ObjectId(appointment_id), "user_id": ObjectId(user_id)})
 
-async def get_appointments_by_user_id(db: AsyncIOMotorDatabase, user_id: str):
-    return await db["appointments"].find({"user_id": ObjectId(user_id)}).to_list(200)
+async def get_user_appointments_page(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    when: Optional[str] = None,
+    expand: Sequence[str] = (),
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Citas del usuario en páginas de `limit`. when="upcoming" deja las que aún
+    no empezaron y when="past" las que ya pasaron (de la más reciente hacia
+    atrás). Sin `when` van todas de la más reciente hacia atrás, para que una
+    sola página traiga las últimas y no las más viejas. `expand` agrega
+    "business" y/o "employee" con una sola agregación. Devuelve
+    (citas, cursor_siguiente).
+    """
+    query: Dict[str, Any] = {"user_id": ObjectId(user_id)}
+    now = datetime.utcnow()
+    if when == "upcoming":
+        query["appointment_time"] = {"$gte": now}
+    elif when == "past":
+        query["appointment_time"] = {"$lt": now}
+    sort = USER_LIST_SORTS["upcoming" if when == "upcoming" else "past"]
+    if expand:
+        stages = [{"$project": LISTING_PROJECTION}]
+        for name in expand:
+            stages += USER_EXPANSIONS[name]
+        return await aggregate_page(db["appointments"], query, sort, limit, cursor, stages)
+    return await fetch_page(db["appointments"], query, sort, limit, cursor, LISTING_PROJECTION)
 
-async def get_appointments_by_business_id(db: AsyncIOMotorDatabase, business_id: str):
-    return await db["appointments"].find({"business_id": ObjectId(business_id)}).to_list(1000)
+# Datos viejos traen "canceled"/"Cancelled": cualquier variante cuenta como cancelada.
+CANCELLED_STATUS = re.compile(r"^cancel+ed$", re.IGNORECASE)
+
+def _reviewable_match(user_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Citas del usuario que ya pasaron y no se cancelaron (habilitan a reseñar)."""
+    return {
+        "user_id": ObjectId(user_id),
+        "status": {"$not": CANCELLED_STATUS},
+        "appointment_time": {"$lte": now or datetime.utcnow()},
+    }
+
+async def get_last_reviewable_appointment(
+    db: AsyncIOMotorDatabase, user_id: str, business_id: str
+) -> Optional[Dict[str, Any]]:
+    """Última cita pasada y no cancelada del usuario con el negocio, o None."""
+    if not ObjectId.is_valid(business_id):
+        return None
+    query = {**_reviewable_match(user_id), "business_id": ObjectId(business_id)}
+    return await db["appointments"].find_one(query, {"_id": 1}, sort=[("appointment_time", DESCENDING)])
+
+async def get_last_reviewable_appointments(
+    db: AsyncIOMotorDatabase, user_id: str, business_ids: List[str]
+) -> Dict[str, str]:
+    """
+    Versión por lote: {business_id: appointment_id} con la última cita
+    reseñable de cada negocio. Los negocios sin cita elegible no aparecen.
+    """
+    oids = [ObjectId(b) for b in business_ids if ObjectId.is_valid(b)]
+    if not oids:
+        return {}
+    pipeline = [
+        {"$match": {**_reviewable_match(user_id), "business_id": {"$in": oids}}},
+        {"$sort": {"business_id": 1, "appointment_time": -1}},
+        {"$group": {"_id": "$business_id", "appointment_id": {"$first": "$_id"}}},
+    ]
+    rows = await db["appointments"].aggregate(pipeline).to_list(length=None)
+    return {str(r["_id"]): str(r["appointment_id"]) for r in rows}
 
 async def get_appointments_by_business_id_and_date(
     db: AsyncIOMotorDatabase,
@@ -51,26 +242,118 @@ async def get_appointments_by_business_id_and_date(
         query["employee_id"] = ObjectId(employee_id)
     return await db["appointments"].find(query).to_list(1000)
 
-async def get_business_appointments_with_users(db: AsyncIOMotorDatabase, business_id: str) -> List[Dict[str, Any]]:
-    if not ObjectId.is_valid(business_id):
-        return []
+async def count_appointments_by_slot(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    start: datetime,
+    end: datetime,
+    employee_id: Optional[str] = None,
+) -> Dict[datetime, Tuple[int, int]]:
+    """
+    Cuenta las citas vigentes de la ventana [start, end) agrupadas por hora
+    de inicio: (todas las del negocio, las del empleado). Igual que los
+    contadores de slot_counters, el total incluye las citas con empleado.
+    """
+    match: Dict[str, Any] = {
+        "business_id": ObjectId(business_id),
+        "appointment_time": {"$gte": start, "$lt": end},
+        "status": {"$ne": "cancelled"},
+    }
+    own: Any = 0
+    if employee_id:
+        own = {"$cond": [{"$eq": ["$employee_id", ObjectId(employee_id)]}, 1, 0]}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$appointment_time", "count": {"$sum": 1}, "own": {"$sum": own}}},
+    ]
+    counts: Dict[datetime, Tuple[int, int]] = {}
+    async for row in db["appointments"].aggregate(pipeline):
+        counts[row["_id"]] = (int(row["count"]), int(row["own"]))
+    return counts
 
-    appts = await db["appointments"].find(
-        {"business_id": ObjectId(business_id)}
-    ).sort("appointment_time", 1).to_list(1000)
+def _business_listing_query(
+    business_id: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    statuses: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"business_id": ObjectId(business_id)}
+    when: Dict[str, Any] = {}
+    if date_from is not None:
+        when["$gte"] = _naive_utc(date_from)
+    if date_to is not None:
+        when["$lt"] = _naive_utc(date_to)
+    if when:
+        query["appointment_time"] = when
+    if statuses:
+        query["status"] = {"$in": statuses}
+    return query
+
+async def get_business_appointments_page(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    statuses: Optional[List[str]] = None,
+    with_users: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Citas del negocio por hora ascendente, en páginas de `limit`
+    (date_from inclusivo, date_to exclusivo). Con with_users cada cita trae
+    "user" con nombre/email. Devuelve (citas, cursor_siguiente).
+    """
+    query = _business_listing_query(business_id, date_from, date_to, statuses)
+    if with_users:
+        stages = [{"$project": LISTING_PROJECTION}, *USER_LOOKUP]
+        return await aggregate_page(db["appointments"], query, BUSINESS_LIST_SORT, limit, cursor, stages)
+    return await fetch_page(db["appointments"], query, BUSINESS_LIST_SORT, limit, cursor, LISTING_PROJECTION)
+
+def stream_business_appointments(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    *,
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    statuses: Optional[List[str]] = None,
+    with_users: bool = False,
+    with_employees: bool = False,
+    batch_size: int = 200,
+) -> AsyncIOMotorCommandCursor:
+    """
+    Mismo filtro y orden que get_business_appointments_page pero sin límite:
+    devuelve el cursor de Motor para consumir las citas a medida que llegan.
+    """
+    query = after_cursor(_business_listing_query(business_id, date_from, date_to, statuses), BUSINESS_LIST_SORT, cursor)
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": query},
+        {"$sort": dict(BUSINESS_LIST_SORT)},
+        {"$project": LISTING_PROJECTION},
+    ]
+    if with_users:
+        pipeline += USER_LOOKUP
+    if with_employees:
+        pipeline += EMPLOYEE_LOOKUP
+    return db["appointments"].aggregate(pipeline, batchSize=batch_size)
+
+async def get_business_day_agenda(db: AsyncIOMotorDatabase, business_id: str, date: datetime) -> List[Dict[str, Any]]:
+    """Citas de un día del negocio ordenadas por hora, con nombre/email del cliente en "user"."""
+    start_of_day = datetime(date.year, date.month, date.day)
+    appts = await db["appointments"].find({
+        "business_id": ObjectId(business_id),
+        "appointment_time": {"$gte": start_of_day, "$lt": start_of_day + timedelta(days=1)},
+    }).sort("appointment_time", 1).to_list(length=None)
 
     user_ids = list({a["user_id"] for a in appts if "user_id" in a})
     users_map: Dict[ObjectId, Dict[str, Any]] = {}
-
     if user_ids:
-        cursor = db["users"].find({"_id": {"$in": user_ids}}, {"full_name": 1, "email": 1})
-        async for u in cursor:
+        async for u in db["users"].find({"_id": {"$in": user_ids}}, {"full_name": 1, "email": 1}):
             users_map[u["_id"]] = u
-
     for a in appts:
-        u = users_map.get(a.get("user_id"))
-        a["user"] = u if u else None
-
+        a["user"] = users_map.get(a.get("user_id"))
     return appts
 
 async def update_status(
@@ -79,10 +362,47 @@ async def update_status(
     user_id: Optional[str],
     status: str,
 ):
+    """
+    Cambia el estado de la cita. Pasar a "cancelled" libera el turno; volver
+    de "cancelled" a otro estado lo ocupa de nuevo y lanza SlotFullError si
+    ya no hay cupo (o SlotUnavailableError si el turno dejó de existir).
+    """
     if not ObjectId.is_valid(appointment_id):
         return None
     query: Dict[str, Any] = {"_id": ObjectId(appointment_id)}
     if user_id:
         query["user_id"] = ObjectId(user_id)
-    await db["appointments"].update_one(query, {"$set": {"status": status, "updated_at": datetime.utcnow()}})
-    return await db["appointments"].find_one({"_id": ObjectId(appointment_id)})
+    update = {"$set": {"status": status, "updated_at": datetime.utcnow()}}
+
+    if status != "cancelled":
+        current = await db["appointments"].find_one(query)
+        if current is not None and current.get("status") == "cancelled":
+            business_id = str(current["business_id"])
+            employee_id = str(current["employee_id"]) if current.get("employee_id") else None
+            slot = current["appointment_time"]
+            await _reserve_slot(db, business_id, employee_id, slot)
+            # solo gana quien hace la transición desde "cancelled"; si otro se adelantó se devuelve el lugar
+            updated = await db["appointments"].find_one_and_update(
+                {**query, "status": "cancelled"}, update, return_document=ReturnDocument.AFTER
+            )
+            if updated is None:
+                await crud_slot_counter.release_booking(db, business_id=business_id, employee_id=employee_id, slot=slot)
+                return await db["appointments"].find_one({"_id": ObjectId(appointment_id)})
+            return updated
+
+    # Solo la transición real de estado libera el turno, así un doble "cancelar" no descuenta dos veces.
+    # Una cita que se canceló entre medias no se reactiva por acá (no tendría su lugar reservado).
+    excluded = [status] if status == "cancelled" else [status, "cancelled"]
+    updated = await db["appointments"].find_one_and_update(
+        {**query, "status": {"$nin": excluded}}, update, return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        return await db["appointments"].find_one({"_id": ObjectId(appointment_id)})
+    if status == "cancelled":
+        await crud_slot_counter.release_booking(
+            db,
+            business_id=updated["business_id"],
+            employee_id=updated.get("employee_id"),
+            slot=updated["appointment_time"],
+        )
+    return updated
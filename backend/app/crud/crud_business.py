@@ -1,18 +1,102 @@
-from typing import Optional
+from array import array
+from typing import Optional, Dict, Iterable, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime, timedelta
 from app.schemas.business import BusinessCreate, BusinessUpdate, Schedule
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument
+from app.core.cache import TTLCache
+from app.core.catalog_cache import BUSINESSES, invalidate_catalog
+from app.core.config import settings
+from app.core.pagination import fetch_page
+from app.crud.crud_review import rating_fields
+from app.db.indexes import index
+
+INDEXES = {
+    "businesses": [
+        index([("status", ASCENDING)], "status"),
+        index([("owner_id", ASCENDING)], "owner"),
+        index(
+            [("name", TEXT), ("description", TEXT), ("address", TEXT)],
+            "text_search",
+            weights={"name": 10, "description": 2, "address": 1},
+            default_language="spanish",
+        ),
+        index([("status", ASCENDING), ("avg_rating", DESCENDING), ("_id", DESCENDING)], "status_rating"),
+        index(
+            [("status", ASCENDING), ("categories", ASCENDING), ("avg_rating", DESCENDING), ("_id", DESCENDING)],
+            "status_category_rating",
+        ),
+        index([("status", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)], "status_name"),
+    ],
+}
+
+SEARCH_SORTS = {
+    "rating": [("avg_rating", DESCENDING), ("_id", DESCENDING)],
+    "name": [("name", ASCENDING), ("_id", ASCENDING)],
+}
+# Vistas de negocio: "summary" para listados (sin horario, solo la primera foto)
+# y "detail" con los campos de BusinessResponse.
+SUMMARY_PROJECTION = {
+    "name": 1,
+    "description": 1,
+    "address": 1,
+    "logo_url": 1,
+    "photos": {"$slice": 1},
+    "categories": 1,
+    "avg_rating": 1,
+    "reviews_count": 1,
+    "appointment_mode": 1,
+}
+DETAIL_PROJECTION = {
+    "owner_id": 1,
+    "name": 1,
+    "description": 1,
+    "address": 1,
+    "logo_url": 1,
+    "photos": 1,
+    "categories": 1,
+    "status": 1,
+    "schedule": 1,
+    "appointment_mode": 1,
+}
+VIEW_PROJECTIONS = {"summary": SUMMARY_PROJECTION, "detail": DETAIL_PROJECTION}
 
 async def get_business(db: AsyncIOMotorDatabase, business_id: str):
     if not ObjectId.is_valid(business_id):
         return None
     return await db.businesses.find_one({"_id": ObjectId(business_id)})
 
-async def get_published_businesses(db: AsyncIOMotorDatabase):
-    cursor = db.businesses.find({"status": "published"})
+async def get_published_businesses(db: AsyncIOMotorDatabase, projection: Optional[dict] = None):
+    cursor = db.businesses.find({"status": "published"}, projection)
     return await cursor.to_list(length=None)
 
+async def search_published_businesses(
+    db: AsyncIOMotorDatabase,
+    *,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    sort: str = "rating",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Negocios publicados filtrados por texto, categoría y calificación mínima,
+    en páginas de `limit`. Devuelve (negocios, cursor_siguiente).
+    Lanza ValueError si el orden o el cursor no son válidos.
+    """
+    if sort not in SEARCH_SORTS:
+        raise ValueError("Orden inválido. Use rating o name.")
+    query: dict = {"status": "published"}
+    if q:
+        query["$text"] = {"$search": q}
+    if category:
+        query["categories"] = category
+    if min_rating is not None:
+        query["avg_rating"] = {"$gte": min_rating}
+    return await fetch_page(db.businesses, query, SEARCH_SORTS[sort], limit, cursor, SUMMARY_PROJECTION)
+
 async def create_business(db: AsyncIOMotorDatabase, business_in: BusinessCreate, owner_id: str):
     business_data = business_in.model_dump()
     logo_url = business_data.get("logo_url")
@@ -25,95 +109,245 @@ async def create_business(db: AsyncIOMotorDatabase, business_in: BusinessCreate,
         "schedule": Schedule().model_dump(),
         "created_at": datetime.utcnow(),
         "appointment_mode": business_data.get("appointment_mode", "generico"),
+        **rating_fields({}),
     })
     result = await db.businesses.insert_one(business_data)
-    return await db.businesses.find_one({"_id": result.inserted_id})
+    business_data["_id"] = result.inserted_id
+    return business_data
 
 async def update_business(db: AsyncIOMotorDatabase, business_id: str, business_in: BusinessUpdate):
     update_data = business_in.model_dump(exclude_unset=True)
     if not update_data:
         return await get_business(db, business_id)
-    await db.businesses.update_one({"_id": ObjectId(business_id)}, {"$set": update_data})
-    return await get_business(db, business_id)
+    updated = await db.businesses.find_one_and_update(
+        {"_id": ObjectId(business_id)}, {"$set": update_data}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_catalog(BUSINESSES)
+    return updated
 
-async def get_businesses_by_owner(db: AsyncIOMotorDatabase, owner_id: str):
-    cursor = db.businesses.find({"owner_id": ObjectId(owner_id)})
+async def get_businesses_by_owner(db: AsyncIOMotorDatabase, owner_id: str, projection: Optional[dict] = None):
+    cursor = db.businesses.find({"owner_id": ObjectId(owner_id)}, projection)
     return await cursor.to_list(length=None)
 
 async def update_business_status(db: AsyncIOMotorDatabase, business_id: str, status: str):
-    await db.businesses.update_one({"_id": ObjectId(business_id)}, {"$set": {"status": status}})
-    return await get_business(db, business_id)
+    updated = await db.businesses.find_one_and_update(
+        {"_id": ObjectId(business_id)}, {"$set": {"status": status}}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_catalog(BUSINESSES)
+    return updated
 
 async def update_business_schedule(db: AsyncIOMotorDatabase, business_id: str, schedule_in: Schedule):
-    await db.businesses.update_one({"_id": ObjectId(business_id)}, {"$set": {"schedule": schedule_in.model_dump()}})
-    return await get_business(db, business_id)
+    schedule = schedule_in.model_dump()
+    updated = await db.businesses.find_one_and_update(
+        {"_id": ObjectId(business_id)}, {"$set": {"schedule": schedule}}, return_document=ReturnDocument.AFTER
+    )
+    prime_slot_grids(business_id, schedule)
+    invalidate_catalog(BUSINESSES)
+    return updated
 
-async def get_available_slots_for_day(
+MAX_SLOT_RANGE_DAYS = 60
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_SLOT_LABELS = [f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)]
+
+# (business_id, weekday, employee_id | None) -> (minutos desde 00:00 como array('H'), capacidad)
+_slot_grids = TTLCache(maxsize=settings.SLOT_GRID_CACHE_SIZE, ttl=settings.SLOT_GRID_CACHE_TTL_SECONDS)
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def _build_day_grid(day_schedule: Optional[dict], allowed: Optional[List[str]] = None) -> Tuple[array, int]:
+    """Rejilla de un día: inicios de turno en minutos y capacidad por turno."""
+    if not day_schedule or not day_schedule.get("is_active"):
+        return array("H"), 0
+    slot_duration = int(day_schedule["slot_duration_minutes"])
+    if slot_duration <= 0:
+        return array("H"), 0
+    offsets = range(_minutes(day_schedule["open_time"]), _minutes(day_schedule["close_time"]), slot_duration)
+    capacity = int(day_schedule["capacity_per_slot"])
+    if allowed is not None:
+        allowed_set = set()
+        for s in allowed:
+            try:
+                allowed_set.add(_minutes(s))
+            except ValueError:
+                continue
+        offsets = [m for m in offsets if m in allowed_set]
+        capacity = 1
+    return array("H", offsets), capacity
+
+def prime_slot_grids(business_id: str, schedule: dict) -> None:
+    """Precalcula las rejillas genéricas de la semana tras guardar un horario."""
+    invalidate_slot_grids(business_id=business_id)
+    for weekday, day in enumerate(WEEKDAYS):
+        _slot_grids.set((business_id, weekday, None), _build_day_grid(schedule.get(day)))
+
+def invalidate_slot_grids(business_id: Optional[str] = None, employee_id: Optional[str] = None) -> None:
+    if business_id:
+        _slot_grids.invalidate_where(lambda k, _: k[0] == business_id)
+    if employee_id:
+        _slot_grids.invalidate_where(lambda k, _: k[2] == employee_id)
+
+def slot_grid_stats() -> Dict[str, int]:
+    return _slot_grids.stats()
+
+async def get_slot_grids(
     db: AsyncIOMotorDatabase,
     business_id: str,
-    date: str,
+    weekdays: Iterable[int],
     employee_id: Optional[str] = None,
-):
+) -> Dict[int, Tuple[array, int]]:
+    """
+    Devuelve la rejilla de turnos para cada día de la semana pedido.
+    Solo lee el negocio/empleado de la BD si falta alguna entrada en caché.
+    """
+    grids: Dict[int, Tuple[array, int]] = {}
+    missing = []
+    for weekday in set(weekdays):
+        grid = _slot_grids.get((business_id, weekday, employee_id))
+        if grid is None:
+            missing.append(weekday)
+        else:
+            grids[weekday] = grid
+    if not missing:
+        return grids
+
     business = await get_business(db, business_id)
     if not business or not business.get("schedule"):
         raise ValueError("El negocio no tiene un horario configurado.")
 
+    allowed_slots: Optional[dict] = None
+    if employee_id:
+        employee = await _get_active_employee(db, business_id, employee_id)
+        if not employee:
+            return {weekday: (array("H"), 0) for weekday in grids.keys() | set(missing)}
+        allowed_slots = employee.get("allowed_slots") or {}
+
+    for weekday in missing:
+        day = WEEKDAYS[weekday]
+        allowed = allowed_slots.get(day, []) if allowed_slots is not None else None
+        grid = _build_day_grid(business["schedule"].get(day), allowed)
+        _slot_grids.set((business_id, weekday, employee_id), grid)
+        grids[weekday] = grid
+    return grids
+
+def _parse_date(value: str) -> datetime:
     try:
-        request_date = datetime.strptime(date, "%Y-%m-%d")
-        day_of_week = request_date.strftime("%A").lower()
+        return datetime.strptime(value, "%Y-%m-%d")
     except ValueError:
         raise ValueError("Formato de fecha inválido. Use YYYY-MM-DD.")
 
-    day_schedule = business["schedule"].get(day_of_week)
-    if not day_schedule or not day_schedule.get("is_active"):
+async def _get_active_employee(db: AsyncIOMotorDatabase, business_id: str, employee_id: str):
+    if not ObjectId.is_valid(employee_id):
+        return None
+    return await db.employees.find_one({
+        "_id": ObjectId(employee_id),
+        "business_id": ObjectId(business_id),
+        "active": True,
+    })
+
+def _free_slots(
+    grid: Tuple[array, int],
+    minute_counts: Dict[int, Tuple[int, int]],
+    business_capacity: Optional[int] = None,
+) -> List[str]:
+    """
+    Turnos con cupo. minute_counts: minuto -> (citas del negocio, citas del empleado).
+    Sin empleado el total se compara con la capacidad de la rejilla; con
+    empleado (business_capacity dada) sus citas con su capacidad y además el
+    total con la del negocio, igual que reserve_booking.
+    """
+    offsets, capacity = grid
+    free = []
+    for m in offsets:
+        total, own = minute_counts.get(m, (0, 0))
+        if business_capacity is None:
+            if total < capacity:
+                free.append(_SLOT_LABELS[m])
+        elif own < capacity and total < business_capacity:
+            free.append(_SLOT_LABELS[m])
+    return free
+
+def _add_minute_count(minute_counts: Dict[int, Tuple[int, int]], when: datetime, n: Tuple[int, int]) -> None:
+    m = when.hour * 60 + when.minute
+    total, own = minute_counts.get(m, (0, 0))
+    minute_counts[m] = (total + n[0], own + n[1])
+
+async def _business_capacities(
+    db: AsyncIOMotorDatabase, business_id: str, weekdays: Iterable[int], employee_id: Optional[str]
+) -> Dict[int, Optional[int]]:
+    """Capacidad del negocio por día cuando se consulta un empleado (None sin empleado)."""
+    weekdays = set(weekdays)
+    if not employee_id:
+        return {weekday: None for weekday in weekdays}
+    grids = await get_slot_grids(db, business_id, weekdays)
+    return {weekday: grids[weekday][1] for weekday in weekdays}
+
+async def get_available_slots_for_day(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    date: str,
+    employee_id: Optional[str] = None,
+):
+    request_date = _parse_date(date)
+    if employee_id and not ObjectId.is_valid(employee_id):
+        return []
+    weekday = request_date.weekday()
+    grids = await get_slot_grids(db, business_id, [weekday], employee_id)
+    grid = grids[weekday]
+    if not grid[0]:
         return []
 
-    open_time = datetime.strptime(day_schedule["open_time"], "%H:%M").time()
-    close_time = datetime.strptime(day_schedule["close_time"], "%H:%M").time()
-    slot_duration = int(day_schedule["slot_duration_minutes"])
-    capacity_business = int(day_schedule["capacity_per_slot"])
+    from app.crud.crud_appointment import count_appointments_by_slot
+    counts = await count_appointments_by_slot(
+        db, business_id, request_date, request_date + timedelta(days=1), employee_id=employee_id
+    )
+    minute_counts: Dict[int, Tuple[int, int]] = {}
+    for when, n in counts.items():
+        _add_minute_count(minute_counts, when, n)
+    capacities = await _business_capacities(db, business_id, [weekday], employee_id)
+    return _free_slots(grid, minute_counts, capacities[weekday])
 
-    from_time = datetime.combine(request_date, open_time)
-    to_time = datetime.combine(request_date, close_time)
-    all_slots = []
-    cur = from_time
-    while cur < to_time:
-        all_slots.append(cur.strftime("%H:%M"))
-        cur += timedelta(minutes=slot_duration)
+async def get_available_slots_for_range(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    date_from: str,
+    date_to: str,
+    employee_id: Optional[str] = None,
+) -> Dict[str, List[str]]:
+    """
+    Disponibilidad de varios días (ambos extremos incluidos) en una sola pasada:
+    usa las rejillas en caché (o lee el negocio/empleado una vez) y agrupa las
+    citas de toda la ventana con una única agregación. Devuelve
+    {"YYYY-MM-DD": ["HH:MM", ...]}.
+    """
+    start = _parse_date(date_from)
+    end = _parse_date(date_to)
+    if end < start:
+        raise ValueError("La fecha final debe ser posterior o igual a la inicial.")
+    days = (end - start).days + 1
+    if days > MAX_SLOT_RANGE_DAYS:
+        raise ValueError(f"El rango máximo es de {MAX_SLOT_RANGE_DAYS} días.")
 
-    capacity = capacity_business
+    dates = [start + timedelta(days=i) for i in range(days)]
+    result: Dict[str, List[str]] = {d.strftime("%Y-%m-%d"): [] for d in dates}
+    if employee_id and not ObjectId.is_valid(employee_id):
+        return result
 
-    from app.crud.crud_appointment import get_appointments_by_business_id_and_date
-    if employee_id:
-        if not ObjectId.is_valid(employee_id):
-            return []
-        employee = await db.employees.find_one({
-            "_id": ObjectId(employee_id),
-            "business_id": ObjectId(business_id),
-            "active": True,
-        })
-        if not employee:
-            return []
-
-        allowed = (employee.get("allowed_slots") or {}).get(day_of_week, [])
-        if not allowed:
-            return []
-
-        allowed_set = set(allowed)
-        all_slots = [s for s in all_slots if s in allowed_set]
-
-        capacity = 1  
-        appointments = await get_appointments_by_business_id_and_date(
-            db, business_id, request_date, employee_id=employee_id
-        )
-    else:
-        appointments = await get_appointments_by_business_id_and_date(
-            db, business_id, request_date
-        )
-
-    slot_counts = {}
-    for app in appointments:
-        t = app["appointment_time"].strftime("%H:%M")
-        slot_counts[t] = slot_counts.get(t, 0) + 1
-
-    return [s for s in all_slots if slot_counts.get(s, 0) < capacity]
+    grids = await get_slot_grids(db, business_id, [d.weekday() for d in dates], employee_id)
+    if not any(offsets for offsets, _ in grids.values()):
+        return result
+
+    from app.crud.crud_appointment import count_appointments_by_slot
+    counts = await count_appointments_by_slot(
+        db, business_id, start, end + timedelta(days=1), employee_id=employee_id
+    )
+    per_day: Dict[str, Dict[int, Tuple[int, int]]] = {}
+    for when, n in counts.items():
+        _add_minute_count(per_day.setdefault(when.strftime("%Y-%m-%d"), {}), when, n)
+    capacities = await _business_capacities(db, business_id, grids.keys(), employee_id)
+
+    for d, day in zip(dates, result):
+        result[day] = _free_slots(grids[d.weekday()], per_day.get(day, {}), capacities[d.weekday()])
+    return result
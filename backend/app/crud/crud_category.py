@@ -1,11 +1,22 @@
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
 from app.schemas.category import CategoryCreate
+from app.core.catalog_cache import CATEGORIES, invalidate_catalog
+from app.db.indexes import index
+
+INDEXES = {
+    "categories": [
+        index([("name", ASCENDING)], "name"),
+    ],
+}
 
 async def create_category(db: AsyncIOMotorDatabase, category: CategoryCreate):
     category_data = category.model_dump()
     result = await db["categories"].insert_one(category_data)
-    return await db["categories"].find_one({"_id": result.inserted_id})
+    invalidate_catalog(CATEGORIES)
+    category_data["_id"] = result.inserted_id
+    return category_data
 
 async def get_category_by_name(db: AsyncIOMotorDatabase, name: str):
     return await db["categories"].find_one({"name": name})
@@ -1,7 +1,16 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ASCENDING
 from app.schemas.category_request import CategoryRequestCreate
+from app.core.catalog_cache import CATEGORIES, invalidate_catalog
+from app.db.indexes import index
+
+INDEXES = {
+    "category_requests": [
+        index([("status", ASCENDING)], "status"),
+    ],
+}
 
 async def create_category_request(db: AsyncIOMotorDatabase, request_in: CategoryRequestCreate, owner_id: str):
     request_data = request_in.model_dump()
@@ -10,7 +19,8 @@ async def create_category_request(db: AsyncIOMotorDatabase, request_in: Category
     request_data["created_at"] = datetime.utcnow()
     
     result = await db["category_requests"].insert_one(request_data)
-    return await db["category_requests"].find_one({"_id": result.inserted_id})
+    request_data["_id"] = result.inserted_id
+    return request_data
 
 async def get_all_pending_category_requests(db: AsyncIOMotorDatabase):
     return await db["category_requests"].find({"status": "pending"}).to_list(100)
@@ -31,14 +41,16 @@ async def approve_category_request_and_create_category(db: AsyncIOMotorDatabase,
             {"_id": ObjectId(request_id)},
             {"$set": {"status": "approved"}}
         )
-        return await db["categories"].find_one({"name": request["category_name"]})
+        return existing_category
 
     new_category = {"name": request["category_name"]}
-    await db["categories"].insert_one(new_category)
+    result = await db["categories"].insert_one(new_category)
+    invalidate_catalog(CATEGORIES)
     
     await db["category_requests"].update_one(
         {"_id": ObjectId(request_id)},
         {"$set": {"status": "approved"}}
     )
     
-    return await db["categories"].find_one({"name": request["category_name"]})
\ No newline at end of file
+    new_category["_id"] = result.inserted_id
+    return new_category
\ No newline at end of file
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
+
+from app.db.indexes import index
+
+COLL = "email_outbox"
+
+INDEXES = {
+    COLL: [
+        index([("status", ASCENDING), ("next_attempt_at", ASCENDING)], "status_next_attempt"),
+        index([("lease_owner", ASCENDING)], "lease_owner", sparse=True),
+    ],
+}
+
+
+async def enqueue(
+    db: AsyncIOMotorDatabase,
+    *,
+    kind: str,
+    to: str,
+    details: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Deja un correo pendiente en el outbox. kind: "confirmation" | "cancellation".
+    El PDF adjunto se genera al despachar a partir de details.
+    """
+    now = datetime.utcnow()
+    doc = {
+        "kind": kind,
+        "to": to,
+        "details": details,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    res = await db[COLL].insert_one(doc)
+    doc["_id"] = res.inserted_id
+    return doc
+
+
+async def claim_batch(db: AsyncIOMotorDatabase, limit: int, lease_seconds: int = 300) -> List[Dict[str, Any]]:
+    """
+    Reserva hasta `limit` correos listos para enviar. Los que quedaron en
+    "sending" con el lease vencido (worker caído) se vuelven a tomar.
+
+    Se reservan con un solo update_many que los marca con un token propio
+    (lease_owner) y después se leen por ese token: si otro worker tomó alguno
+    entre la búsqueda y la reserva, el filtro lo deja afuera.
+    """
+    now = datetime.utcnow()
+    ready = {
+        "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_until": {"$lt": now}},
+        ]
+    }
+    candidates = (
+        await db[COLL].find(ready, {"_id": 1}).sort("next_attempt_at", ASCENDING).limit(limit).to_list(length=None)
+    )
+    if not candidates:
+        return []
+    owner = ObjectId()
+    await db[COLL].update_many(
+        {**ready, "_id": {"$in": [c["_id"] for c in candidates]}},
+        {"$set": {"status": "sending", "locked_until": now + timedelta(seconds=lease_seconds), "lease_owner": owner}},
+    )
+    return await db[COLL].find({"lease_owner": owner}).sort("next_attempt_at", ASCENDING).to_list(length=None)
+
+
+async def mark_sent(db: AsyncIOMotorDatabase, doc: Dict[str, Any]) -> bool:
+    """
+    Marca el correo como enviado. Devuelve False si el lease ya no es nuestro
+    (venció y otro worker lo volvió a tomar): en ese caso no se toca.
+    """
+    res = await db[COLL].update_one(
+        {"_id": doc["_id"], "lease_owner": doc.get("lease_owner")},
+        {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"locked_until": "", "lease_owner": ""}},
+    )
+    return res.matched_count > 0
+
+
+async def mark_failed(
+    db: AsyncIOMotorDatabase,
+    doc: Dict[str, Any],
+    error: str,
+    max_attempts: int,
+    retry_in: Optional[timedelta] = None,
+) -> bool:
+    """
+    Programa un reintento o, agotados los intentos, lo deja en "dead".
+    Igual que mark_sent, devuelve False si se perdió el lease.
+    """
+    attempts = int(doc.get("attempts", 0)) + 1
+    update: Dict[str, Any] = {"attempts": attempts, "last_error": error}
+    if attempts >= max_attempts or retry_in is None:
+        update["status"] = "dead"
+    else:
+        update["status"] = "pending"
+        update["next_attempt_at"] = datetime.utcnow() + retry_in
+    res = await db[COLL].update_one(
+        {"_id": doc["_id"], "lease_owner": doc.get("lease_owner")},
+        {"$set": update, "$unset": {"locked_until": "", "lease_owner": ""}},
+    )
+    return res.matched_count > 0
+
+
+async def count_by_status(db: AsyncIOMotorDatabase) -> Dict[str, int]:
+    rows = await db[COLL].aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(length=None)
+    return {r["_id"]: int(r["count"]) for r in rows}
@@ -1,6 +1,15 @@
 from typing import Dict, Any, List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from app.crud.crud_business import invalidate_slot_grids
+from app.db.indexes import index
+
+INDEXES = {
+    "employees": [
+        index([("business_id", ASCENDING), ("active", ASCENDING)], "business_active"),
+    ],
+}
 
 def _oid(id_str: str) -> ObjectId:
     return ObjectId(id_str)
@@ -14,18 +23,26 @@ async def get_employees_by_business(db: AsyncIOMotorDatabase, business_id: str,
 async def create_employee(db: AsyncIOMotorDatabase, business_id: str, name: str, active: bool = True) -> Dict[str, Any]:
     doc = {"business_id": _oid(business_id), "name": name, "active": active, "allowed_slots": {}}
     res = await db["employees"].insert_one(doc)
-    return await db["employees"].find_one({"_id": res.inserted_id})
+    doc["_id"] = res.inserted_id
+    return doc
 
 async def update_employee(db: AsyncIOMotorDatabase, employee_id: str, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    await db["employees"].update_one({"_id": _oid(employee_id)}, {"$set": update})
-    return await db["employees"].find_one({"_id": _oid(employee_id)})
+    updated = await db["employees"].find_one_and_update(
+        {"_id": _oid(employee_id)}, {"$set": update}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_slot_grids(employee_id=employee_id)
+    return updated
 
 async def delete_employee(db: AsyncIOMotorDatabase, employee_id: str) -> None:
     await db["employees"].delete_one({"_id": _oid(employee_id)})
+    invalidate_slot_grids(employee_id=employee_id)
 
 async def set_allowed_slots(db: AsyncIOMotorDatabase, employee_id: str, allowed_slots: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
-    await db["employees"].update_one({"_id": _oid(employee_id)}, {"$set": {"allowed_slots": allowed_slots}})
-    return await db["employees"].find_one({"_id": _oid(employee_id)})
+    updated = await db["employees"].find_one_and_update(
+        {"_id": _oid(employee_id)}, {"$set": {"allowed_slots": allowed_slots}}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_slot_grids(employee_id=employee_id)
+    return updated
 
 async def get_employee(db: AsyncIOMotorDatabase, employee_id: str) -> Optional[Dict[str, Any]]:
     return await db["employees"].find_one({"_id": _oid(employee_id)})
@@ -1,17 +1,45 @@
 # app/crud/crud_review.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+from app.core import catalog_cache
+from app.core.pagination import fetch_page
+from app.db.indexes import index
 
 
 COLL = "reviews"
 BUSINESSES = "businesses"
 
+INDEXES = {
+    COLL: [
+        index(
+            [("business_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            "business_created_id",
+        ),
+        index([("user_id", ASCENDING), ("appointment_id", ASCENDING)], "user_appointment"),
+    ],
+}
+
+LIST_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+LIST_PROJECTION = {
+    "business_id": 1,
+    "appointment_id": 1,
+    "user_id": 1,
+    "rating": 1,
+    "comment": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "reply.text": 1,
+    "reply.role": 1,
+    "reply.created_at": 1,
+}
+
 
 # ---------------------- helpers ----------------------
 def _to_oid(x: Any) -> Optional[ObjectId]:
@@ -22,38 +50,34 @@ def _to_oid(x: Any) -> Optional[ObjectId]:
         return None
 
 
-def _id_choices(value: Any) -> List[Any]:
+# ---------------------- queries ----------------------
+async def get_reviews_page(
+    db: AsyncIOMotorDatabase,
+    business_id: str,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    rating: Optional[int] = None,
+    has_reply: Optional[bool] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
     """
-    Devuelve una lista con ambas representaciones (str y ObjectId) para usar en $in.
-    Si no se puede convertir a OID, queda solo el str.
+    Reseñas del negocio, más recientes primero, por páginas de `limit`.
+    Devuelve (reseñas, cursor_siguiente). Lanza ValueError si el cursor es inválido.
     """
-    out: List[Any] = []
-    s = str(value) if value is not None else None
-    if s:
-        out.append(s)
-        oid = _to_oid(s)
-        if oid is not None:
-            out.append(oid)
-    return out
-
-
-# ---------------------- queries ----------------------
-async def get_reviews_by_business(db: AsyncIOMotorDatabase, business_id: str) -> List[Dict[str, Any]]:
-    ids = _id_choices(business_id)
-    reviews = (
-        await db[COLL]
-        .find({"business_id": {"$in": ids}})
-        .sort("created_at", -1)
-        .to_list(length=1000)
-    )
-    return reviews
+    query: Dict[str, Any] = {"business_id": _to_oid(business_id)}
+    if rating is not None:
+        query["rating"] = int(rating)
+    if has_reply is True:
+        query["reply"] = {"$type": "object"}
+    elif has_reply is False:
+        query["reply"] = {"$not": {"$type": "object"}}
+    return await fetch_page(db[COLL], query, LIST_SORT, limit, cursor, LIST_PROJECTION)
 
 
 async def get_user_review_for_appointment(
     db: AsyncIOMotorDatabase, user_id: str, appointment_id: str
 ) -> Optional[Dict[str, Any]]:
-    ids = _id_choices(appointment_id)
-    return await db[COLL].find_one({"user_id": user_id, "appointment_id": {"$in": ids}})
+    return await db[COLL].find_one({"user_id": _to_oid(user_id), "appointment_id": _to_oid(appointment_id)})
 
 
 # ---------------------- mutations ----------------------
@@ -68,9 +92,9 @@ async def create_review(
 ) -> Dict[str, Any]:
     now = datetime.utcnow()
     doc = {
-        "business_id": business_id,              # guárdalo como str (compatible con _id_choices)
-        "appointment_id": appointment_id,        # idem
-        "user_id": user_id,
+        "business_id": ObjectId(business_id),
+        "appointment_id": ObjectId(appointment_id),
+        "user_id": ObjectId(user_id),
         "rating": int(rating),
         "comment": comment or "",
         "created_at": now,
@@ -78,6 +102,7 @@ async def create_review(
     }
     res = await db[COLL].insert_one(doc)
     doc["_id"] = res.inserted_id
+    await apply_rating_delta(db, doc["business_id"], added=doc["rating"])
     return doc
 
 
@@ -89,16 +114,27 @@ async def update_review(
 ) -> Optional[Dict[str, Any]]:
     # forzamos updated_at aquí por si el caller no lo puso
     data = {**data, "updated_at": datetime.utcnow()}
-    return await db[COLL].find_one_and_update(
-        {"_id": _to_oid(review_id), "user_id": user_id},
+    # Documento ANTERIOR: hace falta el rating viejo para el delta del negocio
+    before = await db[COLL].find_one_and_update(
+        {"_id": _to_oid(review_id), "user_id": _to_oid(user_id)},
         {"$set": data},
-        return_document=ReturnDocument.AFTER,
+        return_document=ReturnDocument.BEFORE,
     )
+    if before is None:
+        return None
+    if "rating" in data:
+        await apply_rating_delta(
+            db, before["business_id"], added=int(data["rating"]), removed=before.get("rating")
+        )
+    return {**before, **data}
 
 
 async def delete_review(db: AsyncIOMotorDatabase, review_id: str, user_id: str) -> bool:
-    res = await db[COLL].delete_one({"_id": _to_oid(review_id), "user_id": user_id})
-    return res.deleted_count > 0
+    doc = await db[COLL].find_one_and_delete({"_id": _to_oid(review_id), "user_id": _to_oid(user_id)})
+    if doc is None:
+        return False
+    await apply_rating_delta(db, doc["business_id"], removed=doc.get("rating"))
+    return True
 
 
 async def add_reply(
@@ -120,31 +156,183 @@ async def add_reply(
 
 
 # ---------------------- aggregates ----------------------
-async def recompute_business_rating(db: AsyncIOMotorDatabase, business_id: str) -> None:
+# El negocio guarda acumulados que se mantienen con deltas en cada escritura:
+#   sum_ratings, reviews_count, rating_histogram {"1": n, ..., "5": n}
+# y a partir de ellos avg_rating / rating (1 decimal, por compatibilidad).
+STARS = ("1", "2", "3", "4", "5")
+
+
+def _star(rating: Any) -> Optional[str]:
+    try:
+        r = int(rating)
+    except (TypeError, ValueError):
+        return None
+    return str(r) if 1 <= r <= 5 else None
+
+
+def rating_fields(histogram: Dict[str, int]) -> Dict[str, Any]:
+    """Campos agregados del negocio a partir del histograma completo."""
+    hist = {s: int(histogram.get(s, 0)) for s in STARS}
+    count = sum(hist.values())
+    total = sum(int(s) * n for s, n in hist.items())
+    avg = round(total / count, 1) if count else 0.0
+    return {
+        "sum_ratings": total,
+        "reviews_count": count,
+        "rating_histogram": hist,
+        "avg_rating": avg,
+        "rating": avg,
+    }
+
+
+async def apply_rating_delta(
+    db: AsyncIOMotorDatabase,
+    business_id: Any,
+    *,
+    added: Any = None,
+    removed: Any = None,
+) -> None:
+    """
+    Aplica al negocio el alta/baja/cambio de una calificación en una sola
+    actualización atómica (pipeline), sin recorrer sus reseñas.
+    Si el negocio todavía no tiene acumulados (datos previos), hace el
+    recálculo completo una vez y desde ahí sigue incremental. Si otra
+    escritura los inicializó mientras tanto, vuelve a aplicar el delta en vez
+    de pisar sus totales.
     """
-    Recalcula promedio y conteo de reseñas del negocio.
-    Corrige el error 'a group specification must include an _id' usando _id: None.
-    Acepta business_id guardado como str u ObjectId en la colección de reseñas.
+    added, removed = _star(added), _star(removed)
+    if added == removed:
+        return
+    deltas: Dict[str, int] = {}
+    if added:
+        deltas[added] = deltas.get(added, 0) + 1
+    if removed:
+        deltas[removed] = deltas.get(removed, 0) - 1
+    count_delta = sum(deltas.values())
+    sum_delta = sum(int(s) * d for s, d in deltas.items())
+
+    def inc(path: str, delta: int) -> Dict[str, Any]:
+        return {"$add": [{"$ifNull": [f"${path}", 0]}, delta]}
+
+    totals = {"reviews_count": inc("reviews_count", count_delta), "sum_ratings": inc("sum_ratings", sum_delta)}
+    totals.update({f"rating_histogram.{s}": inc(f"rating_histogram.{s}", d) for s, d in deltas.items()})
+    avg = {
+        "$cond": [
+            {"$gt": ["$reviews_count", 0]},
+            {"$round": [{"$divide": ["$sum_ratings", "$reviews_count"]}, 1]},
+            0.0,
+        ]
+    }
+    for _ in range(2):
+        res = await db[BUSINESSES].update_one(
+            {"_id": _to_oid(business_id), "sum_ratings": {"$exists": True}},
+            [{"$set": totals}, {"$set": {"avg_rating": avg, "rating": avg}}],
+        )
+        if res.matched_count:
+            # avg_rating/reviews_count forman parte de la instantánea del catálogo
+            catalog_cache.invalidate_catalog(catalog_cache.BUSINESSES)
+            return
+        if await recompute_business_rating(db, str(business_id), only_missing=True):
+            return
+        # otra escritura inicializó los acumulados (o el negocio no existe): reintenta el delta
+
+
+async def recompute_business_rating(
+    db: AsyncIOMotorDatabase, business_id: str, *, only_missing: bool = False
+) -> bool:
+    """
+    Recalcula desde cero los acumulados de calificación de un negocio.
+    Con only_missing=True solo los escribe si el negocio aún no los tiene,
+    para no pisar los deltas que otra escritura ya aplicó. Devuelve si se
+    actualizó el negocio.
+    """
+    pipeline = [
+        {"$match": {"business_id": _to_oid(business_id), "rating": {"$gte": 1}}},
+        {"$group": {"_id": "$rating", "count": {"$sum": 1}}},
+    ]
+    rows = await db[COLL].aggregate(pipeline).to_list(length=None)
+    histogram: Dict[str, int] = {}
+    for row in rows:
+        star = _star(row["_id"])
+        if star:
+            histogram[star] = histogram.get(star, 0) + int(row["count"])
+
+    query: Dict[str, Any] = {"_id": _to_oid(business_id)}
+    if only_missing:
+        query["sum_ratings"] = {"$exists": False}
+    res = await db[BUSINESSES].update_one(query, {"$set": rating_fields(histogram)})
+    if res.matched_count == 0:
+        return False
+    catalog_cache.invalidate_catalog(catalog_cache.BUSINESSES)
+    return True
+
+
+async def reconcile_business_ratings(db: AsyncIOMotorDatabase) -> Dict[str, int]:
+    """
+    Recalcula los acumulados de todos los negocios en una sola agregación
+    sobre reseñas y los escribe por lotes. Corrige cualquier deriva de los
+    deltas incrementales. Devuelve cuántos negocios se revisaron/corrigieron.
     """
-    ids = _id_choices(business_id)
     pipeline = [
-        {"$match": {"business_id": {"$in": ids}, "rating": {"$gte": 1}}},
-        {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}},
+        {"$match": {"rating": {"$gte": 1}}},
+        {"$group": {"_id": {"business_id": "$business_id", "rating": "$rating"}, "count": {"$sum": 1}}},
     ]
+    histograms: Dict[str, Dict[str, int]] = {}
+    async for row in db[COLL].aggregate(pipeline):
+        star = _star(row["_id"].get("rating"))
+        if not star:
+            continue
+        hist = histograms.setdefault(str(row["_id"].get("business_id")), {})
+        hist[star] = hist.get(star, 0) + int(row["count"])
 
-    agg = await db[COLL].aggregate(pipeline).to_list(1)
-    if agg:
-        avg = float(agg[0].get("avg") or 0.0)
-        count = int(agg[0].get("count") or 0)
-    else:
-        avg = 0.0
-        count = 0
-
-    # redondeo a 1 decimal para mostrar
-    avg_rounded = round(avg, 1)
-
-    # Actualizamos el negocio (guardamos en varios campos por compatibilidad)
-    await db[BUSINESSES].update_one(
-        {"_id": _to_oid(business_id)},
-        {"$set": {"avg_rating": avg_rounded, "reviews_count": count, "rating": avg_rounded}},
+    checked = fixed = 0
+    ops: List[UpdateOne] = []
+    cursor = db[BUSINESSES].find(
+        {}, {"sum_ratings": 1, "reviews_count": 1, "rating_histogram": 1, "avg_rating": 1, "rating": 1}
     )
+    async for biz in cursor:
+        checked += 1
+        fields = rating_fields(histograms.get(str(biz["_id"]), {}))
+        if all(biz.get(k) == v for k, v in fields.items()):
+            continue
+        ops.append(UpdateOne({"_id": biz["_id"]}, {"$set": fields}))
+        fixed += 1
+        if len(ops) >= 500:
+            await db[BUSINESSES].bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await db[BUSINESSES].bulk_write(ops, ordered=False)
+    if fixed:
+        catalog_cache.invalidate_catalog(catalog_cache.BUSINESSES)
+    return {"checked": checked, "fixed": fixed}
+
+
+async def backfill_rating_fields(db: AsyncIOMotorDatabase) -> Optional[Dict[str, int]]:
+    """
+    Completa los acumulados de los negocios que no tienen avg_rating numérico
+    (datos anteriores a los acumulados). La búsqueda ordenada por rating
+    pagina con avg_rating $lt <cursor>, que nunca coincide con un documento
+    sin el campo: sin esto esos negocios desaparecerían de las páginas
+    siguientes. Se llama al arrancar; si no falta ninguno es una sola consulta.
+    """
+    missing = await db[BUSINESSES].find_one({"avg_rating": {"$not": {"$type": "number"}}}, {"_id": 1})
+    if missing is None:
+        return None
+    return await reconcile_business_ratings(db)
+
+
+async def _main() -> None:
+    from app.db.session import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        result = await reconcile_business_ratings(await get_database())
+        print(f"Negocios revisados: {result['checked']}, corregidos: {result['fixed']}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    asyncio.run(_main())
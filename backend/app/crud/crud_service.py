@@ -2,6 +2,7 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.schemas.service import ServiceBase 
 from bson import ObjectId 
+from pymongo import ReturnDocument
 
 async def get_services(db: AsyncIOMotorDatabase):
     services = await db["services"].find().to_list(100)
@@ -10,8 +11,8 @@ async def get_services(db: AsyncIOMotorDatabase):
 async def create_service(db: AsyncIOMotorDatabase, service: ServiceBase):
     service_data = service.model_dump()
     result = await db["services"].insert_one(service_data)
-    created_service = await db["services"].find_one({"_id": result.inserted_id})
-    return created_service
+    service_data["_id"] = result.inserted_id
+    return service_data
 
 async def update_service(db: AsyncIOMotorDatabase, service_id: str, service_in: ServiceBase):
     object_id = ObjectId(service_id) 
@@ -20,8 +21,9 @@ async def update_service(db: AsyncIOMotorDatabase, service_id: str, service_in:
     if not update_data: 
         return await db["services"].find_one({"_id": object_id})
 
-    await db["services"].update_one({"_id": object_id}, {"$set": update_data})
-    return await db["services"].find_one({"_id": object_id})
+    return await db["services"].find_one_and_update(
+        {"_id": object_id}, {"$set": update_data}, return_document=ReturnDocument.AFTER
+    )
 
 async def delete_service(db: AsyncIOMotorDatabase, service_id: str):
     object_id = ObjectId(service_id) 
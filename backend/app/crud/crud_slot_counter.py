@@ -0,0 +1,171 @@
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app.db.indexes import index
+
+COLL = "slot_counters"
+
+# Modelo de contadores por turno:
+#   - employee_id=None: contador del negocio, cuenta TODAS las citas del turno
+#     (genéricas y con empleado) contra capacity_per_slot.
+#   - employee_id=<id>: contador del empleado, cuenta solo sus citas (capacidad 1).
+# Toda reserva ocupa el contador del negocio y, si es con empleado, también
+# el suyo; así coincide con la siembra (_count_existing) y con la disponibilidad.
+
+KEY_INDEX = index(
+    [("business_id", ASCENDING), ("employee_id", ASCENDING), ("slot", ASCENDING)], "slot_counter_key", unique=True
+)
+
+INDEXES = {
+    COLL: [KEY_INDEX],
+}
+
+
+class SlotUnavailableError(ValueError):
+    """La hora pedida no corresponde a ningún turno del horario."""
+
+
+class SlotFullError(ValueError):
+    """El turno ya alcanzó su capacidad."""
+
+
+def _key(business_id: Any, employee_id: Any, slot: datetime) -> Dict[str, Any]:
+    return {
+        "business_id": ObjectId(str(business_id)),
+        "employee_id": ObjectId(str(employee_id)) if employee_id else None,
+        "slot": slot,
+    }
+
+
+async def ensure_key_index(db: AsyncIOMotorDatabase) -> None:
+    """
+    Crea el índice único del contador. reserve() depende de su DuplicateKeyError
+    para no sembrar dos contadores del mismo turno, así que se asegura en cada
+    arranque (sin importar INDEX_BOOTSTRAP) y si falla se propaga el error.
+    """
+    await db[COLL].create_indexes([KEY_INDEX])
+
+
+async def _count_existing(db: AsyncIOMotorDatabase, key: Dict[str, Any]) -> int:
+    """Citas vigentes del turno creadas antes de que existiera su contador."""
+    query: Dict[str, Any] = {
+        "business_id": key["business_id"],
+        "appointment_time": key["slot"],
+        "status": {"$ne": "cancelled"},
+    }
+    if key["employee_id"] is not None:
+        query["employee_id"] = key["employee_id"]
+    return await db["appointments"].count_documents(query)
+
+
+async def reserve(
+    db: AsyncIOMotorDatabase,
+    *,
+    business_id: Any,
+    employee_id: Optional[Any],
+    slot: datetime,
+    capacity: int,
+) -> None:
+    """
+    Ocupa un lugar del turno de forma atómica o lanza SlotFullError.
+    El caso normal es un único find_one_and_update condicionado a count < capacity;
+    solo la primera reserva de un turno siembra el contador con las citas existentes.
+    """
+    key = _key(business_id, employee_id, slot)
+    now = datetime.utcnow()
+    inc = {"$inc": {"count": 1}, "$set": {"updated_at": now}}
+
+    if await db[COLL].find_one_and_update({**key, "count": {"$lt": capacity}}, inc):
+        return
+
+    taken = await _count_existing(db, key)
+    full = taken >= capacity
+    try:
+        await db[COLL].insert_one({**key, "count": taken if full else taken + 1, "updated_at": now})
+    except DuplicateKeyError:
+        # Otro request creó el contador entre medias, o ya existía y está lleno.
+        if await db[COLL].find_one_and_update({**key, "count": {"$lt": capacity}}, inc):
+            return
+        raise SlotFullError("El horario seleccionado ya no tiene cupo.")
+    if full:
+        raise SlotFullError("El horario seleccionado ya no tiene cupo.")
+
+
+async def reserve_booking(
+    db: AsyncIOMotorDatabase,
+    *,
+    business_id: Any,
+    employee_id: Optional[Any],
+    slot: datetime,
+    capacity: int,
+    employee_capacity: int = 1,
+) -> None:
+    """Ocupa el lugar del negocio y, si la cita es con empleado, también el del empleado."""
+    await reserve(db, business_id=business_id, employee_id=None, slot=slot, capacity=capacity)
+    if not employee_id:
+        return
+    try:
+        await reserve(db, business_id=business_id, employee_id=employee_id, slot=slot, capacity=employee_capacity)
+    except BaseException:
+        await release(db, business_id=business_id, employee_id=None, slot=slot)
+        raise
+
+
+async def release_booking(
+    db: AsyncIOMotorDatabase,
+    *,
+    business_id: Any,
+    employee_id: Optional[Any],
+    slot: datetime,
+) -> None:
+    """Inverso de reserve_booking."""
+    await release(db, business_id=business_id, employee_id=None, slot=slot)
+    if employee_id:
+        await release(db, business_id=business_id, employee_id=employee_id, slot=slot)
+
+
+async def sync_business_counters(db: AsyncIOMotorDatabase, now: Optional[datetime] = None) -> int:
+    """
+    Los contadores del negocio creados antes de que las citas con empleado
+    también los ocuparan pueden contar de menos. Para los turnos futuros con
+    citas de empleado, sube el contador a las citas vigentes reales con $max:
+    nunca lo baja, así no pisa una reserva en curso. Idempotente; se llama al
+    arrancar. Devuelve cuántos contadores corrigió.
+    """
+    pipeline = [
+        {"$match": {
+            "appointment_time": {"$gte": now or datetime.utcnow()},
+            "status": {"$ne": "cancelled"},
+        }},
+        {"$group": {
+            "_id": {"business_id": "$business_id", "slot": "$appointment_time"},
+            "count": {"$sum": 1},
+            "with_employee": {"$sum": {"$cond": [{"$ifNull": ["$employee_id", False]}, 1, 0]}},
+        }},
+        {"$match": {"with_employee": {"$gt": 0}}},
+    ]
+    fixed = 0
+    async for row in db["appointments"].aggregate(pipeline):
+        key = {"business_id": row["_id"]["business_id"], "employee_id": None, "slot": row["_id"]["slot"]}
+        res = await db[COLL].update_one({**key, "count": {"$lt": row["count"]}}, {"$max": {"count": row["count"]}})
+        fixed += res.modified_count
+    return fixed
+
+
+async def release(
+    db: AsyncIOMotorDatabase,
+    *,
+    business_id: Any,
+    employee_id: Optional[Any],
+    slot: datetime,
+) -> None:
+    """Libera un lugar del turno (cancelación o fallo al crear la cita)."""
+    await db[COLL].update_one(
+        {**_key(business_id, employee_id, slot), "count": {"$gt": 0}},
+        {"$inc": {"count": -1}, "$set": {"updated_at": datetime.utcnow()}},
+    )
@@ -3,16 +3,29 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List
 
-from app.core.security import get_password_hash
+from app.core.security import hash_password, invalidate_cached_user
 from app.schemas.user import UserCreate, UserUpdate, OwnerRequestSchema
 from app.schemas.business import BusinessCreate
 from app.crud import crud_business
+from app.db.indexes import index
+from pymongo import ASCENDING, ReturnDocument
+
+INDEXES = {
+    "users": [
+        index([("email", ASCENDING)], "email"),
+        index([("owner_request.status", ASCENDING)], "owner_request_status", sparse=True),
+        index([("role", ASCENDING)], "role"),
+    ],
+}
 
 
 DEFAULT_AVATAR_URL = "https://i.imgur.com/6b6psnA.png"
 
+# Lo único que se muestra de un usuario a terceros (autor de una reseña, etc.).
+PUBLIC_PROJECTION = {"full_name": 1, "profile_picture_url": 1}
+
 async def get_user_by_email(db: AsyncIOMotorDatabase, email: str):
     return await db.users.find_one({"email": email})
 
@@ -21,8 +34,15 @@ async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str):
         return None
     return await db.users.find_one({"_id": ObjectId(user_id)})
 
+async def get_public_users(db: AsyncIOMotorDatabase, user_ids: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Perfiles públicos de varios usuarios en una sola consulta; los ids inválidos o inexistentes se omiten."""
+    oids = list({ObjectId(u) for u in user_ids if ObjectId.is_valid(u)})
+    if not oids:
+        return []
+    return await db.users.find({"_id": {"$in": oids}}, PUBLIC_PROJECTION).to_list(length=len(oids))
+
 async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     user_data = user.model_dump()
     user_data["hashed_password"] = hashed_password
     del user_data["password"] 
@@ -32,21 +52,30 @@ async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
     user_data["profile_picture_url"] = DEFAULT_AVATAR_URL 
     
     result = await db.users.insert_one(user_data)
-    created_user = await db.users.find_one({"_id": result.inserted_id})
-    return created_user
+    user_data["_id"] = result.inserted_id
+    return user_data
+
+async def update_password_hash(db: AsyncIOMotorDatabase, user_id: str, hashed_password: str):
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"hashed_password": hashed_password}})
 
 async def update_user(db: AsyncIOMotorDatabase, user_id: str, user_in: UserUpdate):
     update_data = user_in.model_dump(exclude_unset=True)
     if not update_data:
         return await get_user_by_id(db, user_id)
-    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-    return await get_user_by_id(db, user_id)
+    updated = await db.users.find_one_and_update(
+        {"_id": ObjectId(user_id)}, {"$set": update_data}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_cached_user(user_id=user_id)
+    return updated
 
 async def create_owner_request(db: AsyncIOMotorDatabase, user_id: str, request_data: OwnerRequestSchema):
     request_dict = request_data.model_dump()
     request_dict["status"] = "pending"
-    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"owner_request": request_dict}})
-    return await get_user_by_id(db, user_id)
+    updated = await db.users.find_one_and_update(
+        {"_id": ObjectId(user_id)}, {"$set": {"owner_request": request_dict}}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_cached_user(user_id=user_id)
+    return updated
 
 async def get_pending_owner_requests(db: AsyncIOMotorDatabase):
     cursor = db.users.find({"owner_request.status": "pending"})
@@ -61,10 +90,12 @@ async def approve_owner_request(db: AsyncIOMotorDatabase, user_id: str):
     address = request_data.get("address")
     if not business_name or not address:
         return None
-    await db.users.update_one(
+    approved = await db.users.find_one_and_update(
         {"_id": ObjectId(user_id)},
-        {"$set": {"role": "dueño", "owner_request.status": "approved"}}
+        {"$set": {"role": "dueño", "owner_request.status": "approved"}},
+        return_document=ReturnDocument.AFTER,
     )
+    invalidate_cached_user(user_id=user_id)
     business_schema = BusinessCreate(
         name=business_name,
         description=request_data.get("business_description") or "Descripción pendiente.",
@@ -72,14 +103,16 @@ async def approve_owner_request(db: AsyncIOMotorDatabase, user_id: str):
         logo_url=request_data.get("logo_url")
     )
     await crud_business.create_business(db, business_in=business_schema, owner_id=user_id)
-    return await get_user_by_id(db, user_id)
+    return approved
 
 async def reject_owner_request(db: AsyncIOMotorDatabase, user_id: str):
-    await db.users.update_one(
+    rejected = await db.users.find_one_and_update(
         {"_id": ObjectId(user_id)},
-        {"$set": {"owner_request.status": "rejected"}}
+        {"$set": {"owner_request.status": "rejected"}},
+        return_document=ReturnDocument.AFTER,
     )
-    return await get_user_by_id(db, user_id)
+    invalidate_cached_user(user_id=user_id)
+    return rejected
 
 async def get_all_owners(db: AsyncIOMotorDatabase):
     cursor = db.users.find({"role": "dueño"})
@@ -93,11 +126,12 @@ async def get_or_create_social_user(db: AsyncIOMotorDatabase, user_info: dict):
     user = await db.users.find_one({"email": user_info["email"]})
     if user:
         if not user.get("profile_picture_url"):
-            await db.users.update_one(
+            user = await db.users.find_one_and_update(
                 {"_id": user["_id"]},
-                {"$set": {"profile_picture_url": user_info.get("picture", DEFAULT_AVATAR_URL)}}
+                {"$set": {"profile_picture_url": user_info.get("picture", DEFAULT_AVATAR_URL)}},
+                return_document=ReturnDocument.AFTER,
             )
-            user = await db.users.find_one({"email": user_info["email"]})
+            invalidate_cached_user(user_id=user["_id"])
         return user
 
     new_user_data = {
@@ -109,5 +143,5 @@ async def get_or_create_social_user(db: AsyncIOMotorDatabase, user_info: dict):
         "hashed_password": "",
     }
     result = await db.users.insert_one(new_user_data)
-    created_user = await db.users.find_one({"_id": result.inserted_id})
-    return created_user
\ No newline at end of file
+    new_user_data["_id"] = result.inserted_id
+    return new_user_data
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Registro declarativo de índices.
+
+Cada módulo de app/crud declara un dict INDEXES {colección: [IndexModel, ...]}
+con los índices que necesitan sus consultas. Al arrancar se crean los que
+falten (operación idempotente) y desde la terminal se puede comparar lo
+declarado con lo que existe en la BD:
+
+    python -m app.db.indexes            # muestra diferencias
+    python -m app.db.indexes --apply    # crea los índices que faltan
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+
+def index(keys: Sequence[Tuple[str, Any]], name: str, **kwargs: Any) -> IndexModel:
+    """IndexModel con nombre explícito y construcción en segundo plano."""
+    return IndexModel(list(keys), name=name, background=True, **kwargs)
+
+
+def declared_indexes() -> Dict[str, List[IndexModel]]:
+    from app.crud import (
+        crud_appointment,
+        crud_business,
+        crud_category,
+        crud_category_request,
+        crud_email_outbox,
+        crud_employee,
+        crud_review,
+        crud_slot_counter,
+        crud_user,
+    )
+
+    registry: Dict[str, List[IndexModel]] = {}
+    for module in (
+        crud_appointment,
+        crud_business,
+        crud_category,
+        crud_category_request,
+        crud_email_outbox,
+        crud_employee,
+        crud_review,
+        crud_slot_counter,
+        crud_user,
+    ):
+        for coll, models in getattr(module, "INDEXES", {}).items():
+            registry.setdefault(coll, []).extend(models)
+    return registry
+
+
+def _spec(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Parte comparable de una definición de índice (claves y opciones relevantes)."""
+    key = doc["key"]
+    items = list(key.items() if hasattr(key, "items") else key)
+    spec = {
+        "key": [(field, direction) for field, direction in items],
+        "unique": bool(doc.get("unique", False)),
+        "sparse": bool(doc.get("sparse", False)),
+        "partialFilterExpression": doc.get("partialFilterExpression"),
+    }
+    if any(direction == "text" for _, direction in items) or any(field == "_fts" for field, _ in items):
+        # Mongo guarda los índices de texto como _fts/_ftsx; se comparan por pesos e idioma
+        spec["key"] = [("_fts", "text"), ("_ftsx", 1)]
+        spec["weights"] = dict(doc.get("weights") or {})
+        spec["default_language"] = doc.get("default_language", "english")
+    return spec
+
+
+async def diff_indexes(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compara índices declarados vs existentes por colección.
+    missing: declarados que no existen; changed: mismo nombre con otra definición;
+    extra: existen en la BD pero nadie los declara.
+    """
+    report: Dict[str, Dict[str, List[str]]] = {}
+    for coll, models in declared_indexes().items():
+        existing = await db[coll].index_information()
+        declared = {m.document["name"]: m.document for m in models}
+        report[coll] = {
+            "missing": [n for n in declared if n not in existing],
+            "changed": [n for n, d in declared.items() if n in existing and _spec(d) != _spec(existing[n])],
+            "extra": [n for n in existing if n != "_id_" and n not in declared],
+        }
+    return report
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase, dry_run: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Crea los índices declarados que falten. Los que cambiaron de definición
+    solo se reportan: eliminarlos/reconstruirlos es una decisión manual.
+    Los que no se pudieron crear quedan en report[coll]["failed"] con el error.
+    """
+    report = await diff_indexes(db)
+    for entry in report.values():
+        entry["failed"] = []
+    if dry_run:
+        return report
+    declared = declared_indexes()
+    for coll, entry in report.items():
+        to_create = [m for m in declared[coll] if m.document["name"] in entry["missing"]]
+        if not to_create:
+            continue
+        try:
+            await db[coll].create_indexes(to_create)
+        except OperationFailure:
+            # un índice conflictivo hace fallar todo el lote: se reintenta de a uno
+            for model in to_create:
+                try:
+                    await db[coll].create_indexes([model])
+                except OperationFailure as e:
+                    entry["failed"].append(f"{model.document['name']}: {e}")
+    return report
+
+
+def print_report(report: Dict[str, Dict[str, List[str]]]) -> None:
+    for coll in sorted(report):
+        entry = report[coll]
+        if not any(entry.values()):
+            print(f"{coll}: OK")
+            continue
+        for kind in ("missing", "changed", "extra", "failed"):
+            for name in entry.get(kind, ()):
+                print(f"{coll}: {kind} {name}")
+
+
+async def _main(apply: bool) -> None:
+    from app.db.session import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        report = await ensure_indexes(db, dry_run=not apply)
+        print_report(report)
+        if apply:
+            failed = sum(len(entry["failed"]) for entry in report.values())
+            print(f"{failed} índice(s) no se pudieron crear." if failed else "Índices faltantes creados.")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara/crea los índices declarados en app/crud.")
+    parser.add_argument("--apply", action="store_true", help="crea los índices que falten")
+    args = parser.parse_args()
+    asyncio.run(_main(args.apply))
@@ -0,0 +1,123 @@
+"""
+Convierte business_id, appointment_id y user_id de las reseñas de str a
+ObjectId, como en el resto de las colecciones.
+
+Recorre las reseñas por _id en lotes y guarda el avance en la colección
+"migrations", así que si se corta se puede relanzar y sigue donde quedó:
+
+    python -m app.db.migrations.normalize_review_ids --dry-run
+    python -m app.db.migrations.normalize_review_ids
+    python -m app.db.migrations.normalize_review_ids --restart   # ignora el checkpoint
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, UpdateOne
+
+MIGRATION_ID = "normalize_review_ids"
+MIGRATIONS = "migrations"
+REVIEWS = "reviews"
+FIELDS = ("business_id", "appointment_id", "user_id")
+
+
+def _converted(doc: Dict[str, Any]) -> Dict[str, ObjectId]:
+    """Campos del documento que son str con forma de ObjectId, ya convertidos."""
+    out: Dict[str, ObjectId] = {}
+    for field in FIELDS:
+        value = doc.get(field)
+        if isinstance(value, str) and ObjectId.is_valid(value):
+            out[field] = ObjectId(value)
+    return out
+
+
+async def run(
+    db: AsyncIOMotorDatabase,
+    *,
+    batch_size: int = 500,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    Ejecuta (o simula con dry_run) la migración. Devuelve el estado final
+    con los contadores scanned/converted/skipped.
+    """
+    state: Dict[str, Any] = {"scanned": 0, "converted": 0, "skipped": 0, "last_id": None}
+    if not restart:
+        saved = await db[MIGRATIONS].find_one({"_id": MIGRATION_ID})
+        if saved and not dry_run:
+            state.update({k: saved[k] for k in state if k in saved})
+
+    query_base = {"$or": [{field: {"$type": "string"}} for field in FIELDS]}
+    last_id: Optional[ObjectId] = state["last_id"]
+    while True:
+        query = query_base if last_id is None else {"$and": [query_base, {"_id": {"$gt": last_id}}]}
+        batch = (
+            await db[REVIEWS]
+            .find(query, {field: 1 for field in FIELDS})
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+            .to_list(length=batch_size)
+        )
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            changes = _converted(doc)
+            if not changes:
+                # str que no es un ObjectId válido: se deja como está
+                state["skipped"] += 1
+                continue
+            # el filtro con el valor viejo evita pisar una escritura concurrente
+            ops.append(UpdateOne({"_id": doc["_id"], **{f: doc[f] for f in changes}}, {"$set": changes}))
+        if ops and not dry_run:
+            await db[REVIEWS].bulk_write(ops, ordered=False)
+
+        last_id = batch[-1]["_id"]
+        state["scanned"] += len(batch)
+        state["converted"] += len(ops)
+        state["last_id"] = last_id
+        if not dry_run:
+            await db[MIGRATIONS].update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {**state, "status": "running", "updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        print(f"[{MIGRATION_ID}] revisadas {state['scanned']}, convertidas {state['converted']}")
+
+    if not dry_run:
+        await db[MIGRATIONS].update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {**state, "status": "done", "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    return state
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from app.db.session import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        state = await run(
+            await get_database(), batch_size=args.batch_size, dry_run=args.dry_run, restart=args.restart
+        )
+        prefix = "(simulación) " if args.dry_run else ""
+        print(
+            f"{prefix}Reseñas revisadas: {state['scanned']}, convertidas: {state['converted']}, "
+            f"omitidas: {state['skipped']}"
+        )
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normaliza a ObjectId los ids de las reseñas.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta, no escribe nada")
+    parser.add_argument("--restart", action="store_true", help="empieza desde el principio")
+    asyncio.run(_main(parser.parse_args()))
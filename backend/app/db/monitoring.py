@@ -0,0 +1,163 @@
+"""
+Costo en Mongo de cada request.
+
+CommandMonitor es un CommandListener de PyMongo registrado en el cliente de
+Motor. Cada comando se suma al DbStats del request en curso, que viaja en
+un contextvar (Motor copia el contexto al hilo donde ejecuta la operación).
+DbTimingMiddleware abre ese DbStats por request y devuelve el resultado en
+el header Server-Timing:
+
+    Server-Timing: db;dur=12.4;desc="5 comandos", db-max;dur=6.1;desc="find businesses"
+
+Los comandos que superan SLOW_QUERY_MS se loguean con la forma del filtro
+(claves y operadores, sin valores) para detectar índices faltantes o N+1.
+"""
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import settings
+
+# Comandos internos del driver que no cuentan como costo del request.
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "endSessions", "saslStart", "saslContinue", "ping"}
+
+# Dónde está el filtro de cada comando (para el log de lentos).
+_FILTER_FIELDS = {
+    "find": "filter",
+    "findAndModify": "query",
+    "count": "query",
+    "distinct": "query",
+    "aggregate": "pipeline",
+}
+
+
+class DbStats:
+    """Comandos, tiempo total y comando más lento de un request."""
+
+    __slots__ = ("path", "count", "total_ms", "slowest_ms", "slowest", "_lock")
+
+    def __init__(self, path: str = "") -> None:
+        self.path = path
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest = ""
+        self._lock = threading.Lock()
+
+    def add(self, label: str, ms: float) -> None:
+        # las operaciones de un mismo request pueden terminar en hilos distintos
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.slowest_ms:
+                self.slowest_ms = ms
+                self.slowest = label
+
+    def server_timing(self) -> str:
+        value = f'db;dur={self.total_ms:.1f};desc="{self.count} comandos"'
+        if self.count:
+            value += f', db-max;dur={self.slowest_ms:.1f};desc="{self.slowest}"'
+        return value
+
+
+_current: ContextVar[Optional[DbStats]] = ContextVar("db_stats", default=None)
+
+
+def current_stats() -> Optional[DbStats]:
+    return _current.get()
+
+
+def _shape(value: Any) -> Any:
+    """Estructura del filtro sin los valores: {"status": "?", "time": {"$gte": "?"}}."""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [_shape(v) for v in value]
+        return "[?]"
+    return "?"
+
+
+def command_shape(name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """Filtro (y orden) del comando sin valores, para loguear consultas lentas."""
+    if name in ("update", "delete"):
+        ops = command.get(name + "s") or [{}]
+        filt = ops[0].get("q")
+    else:
+        filt = command.get(_FILTER_FIELDS.get(name, "filter"))
+    key = "pipeline" if name == "aggregate" else "filter"
+    shape: Dict[str, Any] = {key: _shape(filt) if filt is not None else None}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    return shape
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Suma cada comando al request actual y loguea los que superan el umbral."""
+
+    def __init__(self, slow_ms: float) -> None:
+        self.slow_ms = slow_ms
+        # (connection_id, request_id) -> (etiqueta, comando); started y succeeded llegan por separado
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        name = event.command_name
+        if name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(name)
+        label = f"{name} {collection}" if isinstance(collection, str) else name
+        self._pending[(event.connection_id, event.request_id)] = (label, event.command)
+
+    def _finished(self, event: Any, failed: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        label, command = pending
+        ms = event.duration_micros / 1000
+        stats = _current.get()
+        if stats is not None:
+            stats.add(label, ms)
+        if ms >= self.slow_ms:
+            where = stats.path if stats is not None else "(fuera de un request)"
+            status = " FALLÓ" if failed else ""
+            print(
+                f"[mongo] comando lento{status}: {label} {ms:.1f} ms en {where} "
+                f"{command_shape(event.command_name, command)}"
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event, failed=True)
+
+
+command_monitor = CommandMonitor(slow_ms=settings.SLOW_QUERY_MS)
+
+
+class DbTimingMiddleware:
+    """Middleware ASGI: abre un DbStats por request y agrega Server-Timing a la respuesta."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = DbStats(f'{scope["method"]} {scope["path"]}')
+        token = _current.set(stats)
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
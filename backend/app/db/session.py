@@ -1,5 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.core.metrics import pool_monitor
+from app.db.monitoring import command_monitor
 
 class DataBase:
     client: AsyncIOMotorClient = None
@@ -11,7 +13,7 @@ async def get_database() -> AsyncIOMotorClient:
 
 async def connect_to_mongo():
     print("Conectando a MongoDB Atlas...")
-    db.client = AsyncIOMotorClient(settings.DATABASE_URL)
+    db.client = AsyncIOMotorClient(settings.DATABASE_URL, event_listeners=[command_monitor, pool_monitor])
     print("¡Conexión a MongoDB Atlas exitosa!")
 
 async def close_mongo_connection():
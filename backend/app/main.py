@@ -5,37 +5,78 @@ try:
 except Exception:
     pass
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.api import api_router
-from app.db.session import connect_to_mongo, close_mongo_connection
+from app.core import metrics
+from app.core.config import settings
+from app.core.serialization import MongoJSONResponse
+from app.crud import crud_email_outbox, crud_review, crud_slot_counter
+from app.db.monitoring import DbTimingMiddleware
+from app.db.session import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_indexes, print_report
+from app.services.google_auth import close_google_auth_client
+from app.services.email_dispatcher import start_dispatcher, stop_dispatcher
+from app.services.render_pool import shutdown_render_pool
 
-app = FastAPI(title="Store Service API")
+app = FastAPI(title="Store Service API", default_response_class=MongoJSONResponse)
 
 origins = [
     "http://localhost",
     "http://localhost:5173",
 ]
 
+# el orden importa: MetricsMiddleware queda dentro de DbTimingMiddleware para leer el tiempo en Mongo
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(DbTimingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    metrics.prepare_routes(app)
+    metrics.start_loop_lag_monitor()
+    # sin este índice dos primeras reservas concurrentes pueden sobrevender un turno
+    await crud_slot_counter.ensure_key_index(await get_database())
+    if settings.INDEX_BOOTSTRAP != "off":
+        report = await ensure_indexes(await get_database(), dry_run=settings.INDEX_BOOTSTRAP == "report")
+        print_report(report)
+    backfill = await crud_review.backfill_rating_fields(await get_database())
+    if backfill:
+        print(f"[Ratings] Acumulados completados en {backfill['fixed']} negocio(s)")
+    synced = await crud_slot_counter.sync_business_counters(await get_database())
+    if synced:
+        print(f"[Turnos] Contadores de negocio corregidos: {synced}")
+    if settings.EMAIL_DISPATCHER_ENABLED:
+        start_dispatcher(await get_database())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await metrics.stop_loop_lag_monitor()
+    await stop_dispatcher()
+    shutdown_render_pool()
+    await close_google_auth_client()
     await close_mongo_connection()
+    metrics.mark_process_dead()
 
 app.include_router(api_router, prefix="/api")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Store Service API"}
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics(db: AsyncIOMotorDatabase = Depends(get_database)):
+    # la profundidad del outbox se consulta al momento del scrape
+    metrics.set_outbox_depth(await crud_email_outbox.count_by_status(db))
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, List, Optional
 from bson import ObjectId
 
 class AppointmentCreate(BaseModel):
@@ -49,3 +49,44 @@ class UserLite(BaseModel):
 
 class AppointmentWithUserResponse(AppointmentResponse):
     user: Optional[UserLite] = None
+
+class BusinessLite(BaseModel):
+    id: str = Field(..., alias="_id")
+    name: Optional[str] = None
+    address: Optional[str] = None
+    categories: List[str] = []
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def _oid_to_str_business(cls, v: Any) -> Any:
+        if isinstance(v, ObjectId):
+            return str(v)
+        return v
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class EmployeeLite(BaseModel):
+    id: str = Field(..., alias="_id")
+    name: Optional[str] = None
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def _oid_to_str_employee(cls, v: Any) -> Any:
+        if isinstance(v, ObjectId):
+            return str(v)
+        return v
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class AppointmentExpandedResponse(AppointmentResponse):
+    """Cita de "mis citas"; business/employee solo vienen si se pidieron con expand."""
+    business: Optional[BusinessLite] = None
+    employee: Optional[EmployeeLite] = None
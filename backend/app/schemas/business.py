@@ -46,3 +46,16 @@ class BusinessResponse(BusinessBase):
 
     class Config:
         from_attributes = True
+
+class BusinessSummary(BaseModel):
+    """Versión liviana para listados y búsqueda (sin horario)."""
+    id: str
+    name: str
+    description: Optional[str] = None
+    address: Optional[str] = None
+    logo_url: Optional[str] = None
+    photos: List[str] = []
+    categories: List[str] = []
+    avg_rating: float = 0.0
+    reviews_count: int = 0
+    appointment_mode: Optional[str] = "generico"
@@ -3,6 +3,8 @@ from typing import Optional, Any
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict, conint
 
+from app.schemas.user import UserPublic
+
 
 class ReviewReply(BaseModel):
     text: str
@@ -45,3 +47,8 @@ class ReviewInDB(ReviewBase):
 class ReviewResponse(ReviewInDB):
     """Modelo de salida."""
     pass
+
+
+class ReviewWithAuthorResponse(ReviewResponse):
+    """Reseña del listado; author solo viene con expand=author."""
+    author: Optional[UserPublic] = None
@@ -42,6 +42,17 @@ class UserResponse(UserBase):
             datetime: lambda dt: dt.isoformat()
         }
 
+class UserPublic(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    full_name: Optional[str] = None
+    profile_picture_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 class Token(BaseModel):
     access_token: str
     token_type: str
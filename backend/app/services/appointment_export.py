@@ -0,0 +1,125 @@
+"""
+Exportación de las citas de un negocio a CSV o iCalendar (.ics).
+
+Ambos formatos se generan línea a línea a partir del cursor de Motor, así
+que la memoria usada no depende de cuántas citas abarque el rango.
+
+appointment_time guarda la hora local del negocio (sin zona), así que las
+horas se exportan tal cual: en el CSV sin sufijo y en el ICS como horas
+"flotantes" (sin Z), que el calendario muestra sin convertir. Solo DTSTAMP
+va en UTC.
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict
+
+from app.crud.crud_business import WEEKDAYS
+
+CSV_COLUMNS = ["id", "fecha_hora", "estado", "cliente", "email", "empleado"]
+# Columnas con texto que escribe el usuario: Excel/Sheets ejecutan como fórmula
+# lo que empieza con estos caracteres, así que se anteponen con un apóstrofo.
+CSV_FREE_TEXT = ("cliente", "email", "empleado")
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+DEFAULT_SLOT_MINUTES = 30
+
+
+def _row(doc: Dict[str, Any]) -> Dict[str, str]:
+    user = doc.get("user") or {}
+    employee = doc.get("employee") or {}
+    return {
+        "id": str(doc["_id"]),
+        "fecha_hora": doc["appointment_time"].strftime("%Y-%m-%dT%H:%M:%S"),
+        "estado": doc.get("status", "confirmed"),
+        "cliente": user.get("full_name") or "",
+        "email": user.get("email") or "",
+        "empleado": employee.get("name") or "",
+    }
+
+
+def _csv_safe(value: str) -> str:
+    return "'" + value if value.startswith(CSV_FORMULA_PREFIXES) else value
+
+
+def _csv_row(doc: Dict[str, Any]) -> Dict[str, str]:
+    row = _row(doc)
+    for column in CSV_FREE_TEXT:
+        row[column] = _csv_safe(row[column])
+    return row
+
+
+async def csv_lines(docs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+
+    def flush() -> str:
+        out = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return out
+
+    writer.writeheader()
+    yield flush()
+    async for doc in docs:
+        writer.writerow(_csv_row(doc))
+        yield flush()
+
+
+def _ics_text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _ics_fold(line: str) -> str:
+    """Corta las líneas a 75 octetos como pide RFC 5545."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, start, width = [], 0, 75
+    while start < len(raw):
+        end = min(start + width, len(raw))
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:  # no partir un carácter UTF-8
+            end -= 1
+        parts.append(raw[start:end].decode("utf-8"))
+        start, width = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_local(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _ics_utc(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+async def ics_lines(docs: AsyncIterator[Dict[str, Any]], business: Dict[str, Any]) -> AsyncIterator[str]:
+    schedule = business.get("schedule") or {}
+    durations = [
+        int((schedule.get(day) or {}).get("slot_duration_minutes") or DEFAULT_SLOT_MINUTES) for day in WEEKDAYS
+    ]
+    stamp = _ics_utc(datetime.utcnow())
+    business_name = business.get("name") or ""
+
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//ServiBook//Citas//ES\r\nCALSCALE:GREGORIAN\r\n"
+    async for doc in docs:
+        row = _row(doc)
+        start = doc["appointment_time"]
+        end = start + timedelta(minutes=durations[start.weekday()])
+        summary = f"{business_name}: {row['cliente'] or row['email'] or 'Cita'}"
+        description = f"Cliente: {row['cliente']}\nEmail: {row['email']}\nEmpleado: {row['empleado']}"
+        status = "CANCELLED" if row["estado"] == "cancelled" else "CONFIRMED"
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{row['id']}@servibook",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_ics_local(start)}",
+            f"DTEND:{_ics_local(end)}",
+            f"SUMMARY:{_ics_text(summary)}",
+            f"DESCRIPTION:{_ics_text(description)}",
+            f"STATUS:{status}",
+            "END:VEVENT",
+        ]
+        yield "".join(_ics_fold(line) for line in lines)
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,156 @@
+"""
+Despachador del outbox de correos.
+
+Corre como tarea asyncio dentro de la API (EMAIL_DISPATCHER_ENABLED) o como
+proceso aparte:
+
+    python -m app.services.email_dispatcher
+"""
+import asyncio
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.metrics import smtp_timer
+from app.crud import crud_email_outbox
+from app.services.notification_service import (
+    SMTPSession,
+    build_message,
+    cancellation_email_content,
+    confirmation_email_content,
+)
+from app.services.render_pool import render_appointment_pdf
+
+_TEMPLATES = {
+    "confirmation": (confirmation_email_content, "Comprobante_Cita.pdf"),
+    "cancellation": (cancellation_email_content, "Cita_Cancelada.pdf"),
+}
+
+
+async def _render_message(doc: Dict[str, Any]):
+    """Genera asunto, cuerpo y PDF adjunto del correo (el PDF se renderiza en el pool de procesos)."""
+    content, filename = _TEMPLATES[doc["kind"]]
+    details = doc["details"]
+    subject, body = content(details)
+    pdf_bytes, _ = await render_appointment_pdf(details, cancelled=(doc["kind"] == "cancellation"))
+    attachment = {"data": pdf_bytes, "maintype": "application", "subtype": "pdf", "filename": filename}
+    return build_message(doc["to"], subject, body, [attachment])
+
+
+class EmailDispatcher:
+    """
+    Vacía el outbox por lotes sobre una única sesión SMTP reutilizada.
+    Los fallos se reintentan con backoff exponencial y, agotados los
+    intentos, el correo queda en estado "dead" para revisión manual.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        *,
+        session: Optional[SMTPSession] = None,
+        batch_size: int = settings.EMAIL_OUTBOX_BATCH_SIZE,
+        poll_seconds: float = settings.EMAIL_OUTBOX_POLL_SECONDS,
+        max_attempts: int = settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+        backoff_seconds: float = 30.0,
+        max_backoff_seconds: float = 3600.0,
+    ):
+        self.db = db
+        self.session = session or SMTPSession()
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def wake(self) -> None:
+        """Avisa que hay correos nuevos para no esperar al siguiente sondeo."""
+        self._wakeup.set()
+
+    def _retry_in(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.backoff_seconds * (2 ** attempts), self.max_backoff_seconds))
+
+    async def drain_once(self) -> int:
+        """Envía un lote. Devuelve cuántos correos se procesaron."""
+        batch = await crud_email_outbox.claim_batch(self.db, self.batch_size)
+        for doc in batch:
+            try:
+                msg = await _render_message(doc)
+                with smtp_timer():
+                    await asyncio.to_thread(self.session.send, msg)
+            except Exception as e:
+                print(f"[Email] Error enviando correo {doc['_id']}: {e}")
+                kept = await crud_email_outbox.mark_failed(
+                    self.db, doc, str(e), self.max_attempts, self._retry_in(int(doc.get("attempts", 0)))
+                )
+            else:
+                kept = await crud_email_outbox.mark_sent(self.db, doc)
+            if not kept:
+                print(f"[Email] Se perdió el lease del correo {doc['_id']}: lo tomó otro worker")
+        return len(batch)
+
+    async def run_forever(self) -> None:
+        try:
+            while not self._stopping:
+                try:
+                    processed = await self.drain_once()
+                except Exception as e:
+                    print(f"[Email] Error en el despachador: {e}")
+                    processed = 0
+                if processed >= self.batch_size:
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await asyncio.to_thread(self.session.close)
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+
+
+_dispatcher: Optional[EmailDispatcher] = None
+_task: Optional[asyncio.Task] = None
+
+
+def start_dispatcher(db: AsyncIOMotorDatabase) -> EmailDispatcher:
+    global _dispatcher, _task
+    _dispatcher = EmailDispatcher(db)
+    _task = asyncio.create_task(_dispatcher.run_forever())
+    return _dispatcher
+
+
+async def stop_dispatcher() -> None:
+    global _dispatcher, _task
+    if _dispatcher is None or _task is None:
+        return
+    _dispatcher.stop()
+    await _task
+    _dispatcher = None
+    _task = None
+
+
+def notify_dispatcher() -> None:
+    if _dispatcher is not None:
+        _dispatcher.wake()
+
+
+async def _main() -> None:
+    from app.db.session import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        await EmailDispatcher(await get_database()).run_forever()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
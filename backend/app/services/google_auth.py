@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import JWTError, jwt
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+class GoogleAuthError(Exception):
+    """El token de Google no es válido o no trae los datos necesarios."""
+
+
+class GoogleAuthClient:
+    """
+    Verifica tokens de Google sin bloquear el event loop.
+
+    - ID tokens (JWT): se validan localmente con las claves públicas (JWKS)
+      de Google, que se cachean según su Cache-Control.
+    - Access tokens: se consulta el endpoint userinfo con un cliente HTTP
+      asíncrono que reutiliza conexiones.
+    En ambos casos el resultado se guarda unos minutos para no repetir la
+    verificación del mismo token. Las URLs y el transport son inyectables
+    para poder probarlo contra un servidor local.
+    """
+
+    def __init__(
+        self,
+        *,
+        client_id: str,
+        userinfo_url: str = "https://www.googleapis.com/oauth2/v3/userinfo",
+        jwks_url: str = "https://www.googleapis.com/oauth2/v3/certs",
+        timeout: float = 5.0,
+        cache_ttl: float = 300.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.client_id = client_id
+        self.userinfo_url = userinfo_url
+        self.jwks_url = jwks_url
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            transport=transport,
+        )
+        self._tokens = TTLCache(maxsize=10000, ttl=cache_ttl)
+        self._jwks: Optional[Dict[str, Any]] = None
+        self._jwks_expires_at = 0.0
+        self._jwks_lock = asyncio.Lock()
+
+    async def get_user_info(self, token: str) -> Dict[str, Any]:
+        """Devuelve {"email", "name", "picture"} o lanza GoogleAuthError."""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        cached = self._tokens.get(key)
+        if cached is not None:
+            return cached
+
+        if token.count(".") == 2:
+            info = await self._verify_id_token(token)
+        else:
+            info = await self._fetch_userinfo(token)
+
+        if not info.get("email"):
+            raise GoogleAuthError("No se pudo obtener el email de Google.")
+        user_info = {"email": info["email"], "name": info.get("name"), "picture": info.get("picture")}
+        self._tokens.set(key, user_info)
+        return user_info
+
+    async def _fetch_userinfo(self, access_token: str) -> Dict[str, Any]:
+        response = await self._http.get(self.userinfo_url, headers={"Authorization": f"Bearer {access_token}"})
+        if response.status_code != 200:
+            raise GoogleAuthError("Token de Google inválido.")
+        return response.json()
+
+    async def _get_jwks(self, force: bool = False) -> Dict[str, Any]:
+        async with self._jwks_lock:
+            if self._jwks is not None and not force and time.monotonic() < self._jwks_expires_at:
+                return self._jwks
+            response = await self._http.get(self.jwks_url)
+            response.raise_for_status()
+            self._jwks = response.json()
+            self._jwks_expires_at = time.monotonic() + _max_age(response.headers.get("cache-control"))
+            return self._jwks
+
+    async def _verify_id_token(self, id_token: str) -> Dict[str, Any]:
+        try:
+            kid = jwt.get_unverified_header(id_token).get("kid")
+        except JWTError:
+            raise GoogleAuthError("Token de Google inválido.")
+
+        jwks = await self._get_jwks()
+        if kid and not any(k.get("kid") == kid for k in jwks.get("keys", [])):
+            # Google rota sus claves: si no conocemos el kid refrescamos una vez.
+            jwks = await self._get_jwks(force=True)
+
+        try:
+            claims = jwt.decode(
+                id_token,
+                jwks,
+                algorithms=["RS256"],
+                audience=self.client_id,
+                issuer=GOOGLE_ISSUERS,
+                options={"verify_at_hash": False},
+            )
+        except JWTError:
+            raise GoogleAuthError("Token de Google inválido.")
+        if claims.get("email_verified") in (False, "false"):
+            raise GoogleAuthError("El email de Google no está verificado.")
+        return claims
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+def _max_age(cache_control: Optional[str], default: float = 3600.0) -> float:
+    for part in (cache_control or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "max-age" and value.isdigit():
+            return float(value)
+    return default
+
+
+_client: Optional[GoogleAuthClient] = None
+
+
+def get_google_auth_client() -> GoogleAuthClient:
+    """Dependencia de FastAPI; en pruebas se reemplaza con app.dependency_overrides."""
+    global _client
+    if _client is None:
+        _client = GoogleAuthClient(
+            client_id=settings.GOOGLE_CLIENT_ID,
+            userinfo_url=settings.GOOGLE_USERINFO_URL,
+            jwks_url=settings.GOOGLE_JWKS_URL,
+            timeout=settings.GOOGLE_HTTP_TIMEOUT_SECONDS,
+            cache_ttl=settings.GOOGLE_TOKEN_CACHE_TTL_SECONDS,
+        )
+    return _client
+
+
+async def close_google_auth_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,9 +1,10 @@
 import io
 import os
+import time
 import qrcode
 import smtplib
 from email.message import EmailMessage
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -58,54 +59,79 @@ def _smtp_connect() -> smtplib.SMTP:
     return server
 
 
-def _send_email(
+class SMTPSession:
+    """
+    Conexión SMTP persistente para enviar muchos correos seguidos.
+    Se conecta al primer envío, comprueba con NOOP si estuvo inactiva y se
+    reconecta una vez si el servidor cerró la sesión.
+    """
+
+    def __init__(self, connect=None, idle_check_seconds: float = 30.0):
+        self._connect = connect or _smtp_connect
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.idle_check_seconds = idle_check_seconds
+
+    def _ensure(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_check_seconds:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def send(self, msg: EmailMessage) -> None:
+        try:
+            self._ensure().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.close()
+            self._ensure().send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+def build_message(
     to: str,
     subject: str,
     body_text: str,
     attachments: Optional[List[dict]] = None
-) -> bool:
+) -> EmailMessage:
     """
-    Envía un correo simple con adjuntos opcionales.
+    Arma el mensaje con adjuntos opcionales.
     attachments: lista de dicts con:
       { "data": bytes, "maintype": "application", "subtype": "pdf", "filename": "archivo.pdf" }
     """
-    try:
-        msg = EmailMessage()
-        real_from = FROM_EMAIL or SMTP_USER or "no-reply@example.com"
-        msg["From"] = f"{FROM_NAME} <{real_from}>"
-        msg["To"] = to
-        msg["Subject"] = subject
-        msg.set_content(body_text)
-
-        if attachments:
-            for att in attachments:
-                msg.add_attachment(
-                    att["data"],
-                    maintype=att.get("maintype", "application"),
-                    subtype=att.get("subtype", "octet-stream"),
-                    filename=att.get("filename", "attachment.bin"),
-                )
-
-        server = _smtp_connect()
-        server.send_message(msg)
-        server.quit()
-        return True
-
-    except Exception as e:
-        print(f"[Email] Error enviando correo: {e}")
-        print(
-            f"[Email] DEBUG -> host={SMTP_HOST} port={SMTP_PORT} ssl={SMTP_USE_SSL} tls={SMTP_USE_TLS} "
-            f"user_set={'YES' if SMTP_USER else 'NO'} from={FROM_EMAIL or '(empty)'}"
-        )
-        return False
-
-
-
-def send_confirmation_email(*, user_email: str, details: Dict[str, Any], pdf_bytes: bytes) -> bool:
-    """
-    Envía correo de confirmación de cita con el PDF adjunto.
-    details: { id, user_name, business_name, date, time, address, ... }
-    """
+    msg = EmailMessage()
+    real_from = FROM_EMAIL or SMTP_USER or "no-reply@example.com"
+    msg["From"] = f"{FROM_NAME} <{real_from}>"
+    msg["To"] = to
+    msg["Subject"] = subject
+    msg.set_content(body_text)
+
+    if attachments:
+        for att in attachments:
+            msg.add_attachment(
+                att["data"],
+                maintype=att.get("maintype", "application"),
+                subtype=att.get("subtype", "octet-stream"),
+                filename=att.get("filename", "attachment.bin"),
+            )
+    return msg
+
+
+def confirmation_email_content(details: Dict[str, Any]) -> Tuple[str, str]:
+    """Asunto y cuerpo del correo de confirmación."""
     subject = f"Confirmación de cita - {details.get('business_name','')}"
     body = (
         f"Hola {details.get('user_name','')},\n\n"
@@ -117,24 +143,11 @@ def send_confirmation_email(*, user_email: str, details: Dict[str, Any], pdf_byt
         "Adjuntamos tu comprobante en PDF.\n\n"
         "Gracias por utilizar ServiBook."
     )
-    return _send_email(
-        to=user_email,
-        subject=subject,
-        body_text=body,
-        attachments=[{
-            "data": pdf_bytes,
-            "maintype": "application",
-            "subtype": "pdf",
-            "filename": "Comprobante_Cita.pdf",
-        }],
-    )
+    return subject, body
 
 
-def send_cancellation_email(*, user_email: str, details: Dict[str, Any], pdf_bytes: Optional[bytes] = None) -> bool:
-    """
-    Envía correo de cancelación de cita con PDF adjunto (opcional).
-    details: { id, user_name, business_name, date, time, address, ... }
-    """
+def cancellation_email_content(details: Dict[str, Any]) -> Tuple[str, str]:
+    """Asunto y cuerpo del correo de cancelación."""
     subject = f"Cita cancelada - {details.get('business_name','')}"
     body = (
         f"Hola {details.get('user_name','')},\n\n"
@@ -146,15 +159,7 @@ def send_cancellation_email(*, user_email: str, details: Dict[str, Any], pdf_byt
         "Adjuntamos el comprobante en PDF con el estado de cancelación.\n\n"
         "Equipo ServiBook."
     )
-    attachments = []
-    if pdf_bytes:
-        attachments.append({
-            "data": pdf_bytes,
-            "maintype": "application",
-            "subtype": "pdf",
-            "filename": "Cita_Cancelada.pdf",
-        })
-    return _send_email(to=user_email, subject=subject, body_text=body, attachments=attachments)
+    return subject, body
 
 
 
@@ -188,8 +193,34 @@ def generate_appointment_pdf_as_bytes(details: Dict[str, Any], cancelled: bool =
     Si cancelled=True o details['status']=="cancelled", se coloca marca de agua CANCELADA.
     """
     buffer = io.BytesIO()
-    w, h = A4
     c = canvas.Canvas(buffer, pagesize=A4)
+    _draw_appointment_page(c, details, cancelled)
+    c.save()
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+def generate_appointments_batch_pdf_as_bytes(items: List[Dict[str, Any]]) -> bytes:
+    """
+    Renderiza varios comprobantes en un único PDF (una página por cita).
+    Cada item es un details como en generate_appointment_pdf_as_bytes; si no
+    trae qr_png se genera a partir de su id.
+    """
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for details in items:
+        if not details.get("qr_png"):
+            details = {**details, "qr_png": generate_qr_code_as_bytes(str(details.get("id", ""))).getvalue()}
+        _draw_appointment_page(c, details, details.get("status") == "cancelled")
+    c.save()
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+def _draw_appointment_page(c: canvas.Canvas, details: Dict[str, Any], cancelled: bool) -> None:
+    w, h = A4
 
     header_h = 28 * mm
     c.setFillColor(PRIMARY)
@@ -255,7 +286,3 @@ def generate_appointment_pdf_as_bytes(details: Dict[str, Any], cancelled: bool =
     c.drawCentredString(w / 2, 10 * mm, "Gracias por reservar con ServiBook")
 
     c.showPage()
-    c.save()
-    pdf = buffer.getvalue()
-    buffer.close()
-    return pdf
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Cambiar si cambia el diseño del PDF/QR para no servir renders viejos.
+RENDER_VERSION = "1"
+
+
+def _private_directory(path: str) -> bool:
+    """Crea la carpeta con 0700 si no existe y verifica que sea propia y privada."""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        print(f"[RenderCache] Caché en disco desactivada, no se pudo crear {path}: {e}")
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        print(f"[RenderCache] Caché en disco desactivada: {path} no es una carpeta (¿enlace simbólico?)")
+        return False
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        print(
+            f"[RenderCache] Caché en disco desactivada: {path} debe pertenecer a este usuario "
+            f"y no tener permisos para grupo/otros (tiene {stat.S_IMODE(st.st_mode):o})"
+        )
+        return False
+    return True
+
+
+class RenderCache:
+    """
+    Caché de archivos generados direccionada por contenido.
+    Nivel 1: memoria (LRU acotado por bytes). Nivel 2: disco, un archivo por
+    clave, acotado por bytes y desalojando por mtime (cada acierto lo renueva);
+    se puede borrar en cualquier momento porque todo es regenerable.
+    El disco se lee y escribe en un hilo aparte para no bloquear el event loop.
+
+    Los PDF/QR llevan datos de clientes: la carpeta tiene que ser del usuario
+    del proceso y privada (0700) y cada archivo se escribe con 0600. Si no
+    cumple, el nivel de disco queda desactivado.
+    """
+
+    def __init__(self, max_memory_bytes: int, directory: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # estimación de lo ocupado en disco: lo medido en el último barrido más lo escrito desde entonces
+        self._disk_bytes: Optional[int] = None
+        self._lock = Lock()
+        self._disk_lock = Lock()
+        if directory and not _private_directory(directory):
+            self.directory = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # marca de uso para el desalojo por mtime
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        tmp = None
+        try:
+            # mkstemp crea el archivo con 0600 y un nombre imposible de adivinar
+            fd, tmp = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"[RenderCache] No se pudo escribir en disco: {e}")
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+            return
+        if not self.max_disk_bytes:
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk()[1]
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self) -> Tuple[List[Tuple[float, int, str]], int]:
+        """(mtime, tamaño, path) de cada archivo de la carpeta y el total en bytes."""
+        entries: List[Tuple[float, int, str]] = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.is_file():
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except OSError:
+            pass
+        return entries, total
+
+    def _evict_disk(self) -> None:
+        # la carpeta la comparten todos los workers: se mide de nuevo antes de borrar,
+        # y se baja al 90% del tope para no barrer la carpeta en cada escritura
+        entries, total = self._scan_disk()
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self._remember(key, data)
+                self._count(hit=True)
+                return data
+        self._count(hit=False)
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = {
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+        if self._disk_bytes is not None:
+            stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+
+_cache = RenderCache(
+    max_memory_bytes=settings.RENDER_CACHE_MEMORY_BYTES,
+    directory=settings.RENDER_CACHE_DIR or None,
+    max_disk_bytes=settings.RENDER_CACHE_DISK_BYTES,
+)
+
+
+async def get(key: str) -> Optional[bytes]:
+    return await _cache.get(key)
+
+
+async def put(key: str, data: bytes) -> None:
+    await _cache.put(key, data)
+
+
+def render_key(kind: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return f"{kind}-" + hashlib.sha256(f"{RENDER_VERSION}:{raw}".encode()).hexdigest()
+
+
+def qr_key(content: str) -> str:
+    return render_key("qr", {"content": content})
+
+
+def pdf_key(details: Dict[str, Any], cancelled: bool) -> str:
+    return render_key("pdf", {"details": details, "cancelled": bool(cancelled)})
+
+
+def etag(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], key: str) -> bool:
+    if not if_none_match:
+        return False
+    tag = etag(key)
+    return any(t.strip() in (tag, "*") for t in if_none_match.split(","))
+
+
+def render_cache_stats() -> Dict[str, int]:
+    return _cache.stats()
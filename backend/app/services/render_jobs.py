@@ -0,0 +1,28 @@
+"""
+Trabajos que corren dentro de los procesos del pool de renderizado.
+
+Este módulo es lo único que importan los workers (junto con
+notification_service): no toca app.core.metrics, así que un worker nunca
+registra métricas propias ni deja archivos en PROMETHEUS_MULTIPROC_DIR.
+"""
+import os
+from typing import Any, Dict
+
+from app.services.notification_service import (
+    generate_appointment_pdf_as_bytes,
+    generate_qr_code_as_bytes,
+)
+
+
+def init_worker() -> None:
+    """Initializer del pool: por si algo importa prometheus_client, que no escriba en modo multiproceso."""
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+
+def qr_png_job(content: str) -> bytes:
+    return generate_qr_code_as_bytes(content).getvalue()
+
+
+def pdf_job(details: Dict[str, Any], cancelled: bool) -> bytes:
+    qr_png = qr_png_job(str(details.get("id", "")))
+    return generate_appointment_pdf_as_bytes({**details, "qr_png": qr_png}, cancelled=cancelled)
@@ -0,0 +1,75 @@
+"""
+Renderizado de PDF/QR fuera del event loop.
+
+ReportLab y qrcode son CPU puro y mantienen el GIL, así que se ejecutan en
+un ProcessPoolExecutor. Un semáforo limita cuántos trabajos puede tener
+encolados este worker para que un pico de descargas no acapare el pool.
+Los trabajos viven en render_jobs para que los procesos del pool no importen
+las métricas (ver su docstring).
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import render_timer
+from app.services import render_cache
+from app.services.notification_service import generate_appointments_batch_pdf_as_bytes
+from app.services.render_jobs import init_worker, pdf_job, qr_png_job
+
+_executor: Optional[ProcessPoolExecutor] = None
+_semaphore = asyncio.Semaphore(settings.RENDER_POOL_MAX_CONCURRENCY)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: no heredar del padre el event loop ni los sockets de Motor
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.RENDER_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+    return _executor
+
+
+async def _run(kind: str, fn: Callable[..., bytes], *args: Any) -> bytes:
+    with render_timer(kind):
+        async with _semaphore:
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+async def render_qr_png(content: str) -> Tuple[bytes, str]:
+    key = render_cache.qr_key(content)
+    data = await render_cache.get(key)
+    if data is None:
+        data = await _run("qr", qr_png_job, content)
+        await render_cache.put(key, data)
+    return data, key
+
+
+async def render_appointment_pdf(details: Dict[str, Any], cancelled: bool = False) -> Tuple[bytes, str]:
+    key = render_cache.pdf_key(details, cancelled)
+    data = await render_cache.get(key)
+    if data is None:
+        data = await _run("pdf", pdf_job, details, cancelled)
+        await render_cache.put(key, data)
+    return data, key
+
+
+async def render_appointments_batch_pdf(items: List[Dict[str, Any]]) -> bytes:
+    """Un único PDF multipágina renderizado en una sola pasada dentro del pool."""
+    return await _run("agenda", generate_appointments_batch_pdf_as_bytes, items)
+
+
+def shutdown_render_pool() -> None:
+    global _executor
+    if _executor is not None:
+        pids = list((_executor._processes or {}).keys())
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        # por si algún worker llegó a escribir en PROMETHEUS_MULTIPROC_DIR
+        for pid in pids:
+            metrics.mark_process_dead(pid)
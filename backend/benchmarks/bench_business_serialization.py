@@ -0,0 +1,84 @@
+"""
+Costo por negocio de serializar los listados de /businesses.
+
+Compara el camino anterior (dicts devueltos a FastAPI, que valida contra
+BusinessResponse y luego codifica) con las vistas detail/summary actuales.
+No necesita Mongo: usa documentos sintéticos con la forma de los reales.
+
+    python -m benchmarks.bench_business_serialization [--items 1000] [--rounds 50]
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.api.endpoints.businesses import convert_business_to_response, serialize_businesses
+from app.schemas.business import BusinessResponse, Schedule
+
+
+def _fake_business(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "owner_id": ObjectId(),
+        "name": f"Negocio {i}",
+        "description": "Descripción de ejemplo para el negocio " * 3,
+        "address": f"Calle {i} 123, Ciudad",
+        "logo_url": f"https://cdn.example.com/logos/{i}.png",
+        "photos": [f"https://cdn.example.com/photos/{i}/{n}.jpg" for n in range(6)],
+        "categories": ["Salud", "Belleza"],
+        "status": "published",
+        "schedule": Schedule().model_dump(),
+        "appointment_mode": "generico",
+        "avg_rating": 4.2,
+        "reviews_count": 37,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _legacy(docs: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[BusinessResponse])
+    validated = adapter.validate_python([convert_business_to_response(b) for b in docs])
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def _summary_docs(docs: List[dict]) -> List[dict]:
+    # lo que devuelve Mongo con la proyección resumida
+    keep = ("_id", "name", "description", "address", "logo_url", "categories", "avg_rating", "reviews_count", "appointment_mode")
+    return [{**{k: d[k] for k in keep}, "photos": d["photos"][:1]} for d in docs]
+
+
+def _time(fn, rounds: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    docs = [_fake_business(i) for i in range(args.items)]
+    summary_docs = _summary_docs(docs)
+    cases = {
+        "anterior (FastAPI)": lambda: _legacy(docs),
+        "detail": lambda: serialize_businesses(docs, "detail"),
+        "summary": lambda: serialize_businesses(summary_docs, "summary"),
+    }
+    print(f"{args.items} negocios, {args.rounds} rondas")
+    for name, fn in cases.items():
+        per_call = _time(fn, args.rounds)
+        size = len(fn())
+        print(f"{name:>20}: {per_call * 1000:8.2f} ms/lista  {per_call / args.items * 1e6:7.2f} µs/negocio  {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
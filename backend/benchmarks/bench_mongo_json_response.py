@@ -0,0 +1,97 @@
+"""
+MongoJSONResponse con documentos crudos vs. el camino anterior de los
+listados (conversión a mano + modelo Pydantic + validación/serialización
+de FastAPI contra response_model + JSONResponse).
+
+    python -m benchmarks.bench_mongo_json_response [--items 1000] [--rounds 50]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.api.endpoints.reviews import _normalize_review_doc
+from app.core.serialization import MongoJSONResponse
+from app.schemas.appointment import AppointmentWithUserResponse
+from app.schemas.review import ReviewResponse
+
+
+def _appointments(n: int) -> List[Dict[str, Any]]:
+    start = datetime(2026, 1, 1, 9)
+    return [
+        {
+            "_id": ObjectId(),
+            "business_id": ObjectId(),
+            "user_id": ObjectId(),
+            "appointment_time": start + timedelta(minutes=30 * i),
+            "status": "confirmed",
+            "employee_id": ObjectId() if i % 2 else None,
+            "user": {"_id": ObjectId(), "email": f"cliente{i}@example.com", "full_name": f"Cliente {i}"},
+        }
+        for i in range(n)
+    ]
+
+
+def _reviews(n: int) -> List[Dict[str, Any]]:
+    now = datetime(2026, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "business_id": ObjectId(),
+            "appointment_id": ObjectId(),
+            "user_id": ObjectId(),
+            "rating": 1 + i % 5,
+            "comment": "Muy buena atención, volvería a reservar." * 2,
+            "created_at": now,
+            "updated_at": now,
+            "reply": {"text": "¡Gracias!", "role": "owner", "created_at": now} if i % 3 == 0 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def _fastapi_path(model: Any, prepare: Callable[[Dict[str, Any]], Any]) -> Callable[[List[Dict[str, Any]]], bytes]:
+    adapter = TypeAdapter(List[model])
+
+    def run(docs: List[Dict[str, Any]]) -> bytes:
+        returned = [model.model_validate(prepare(d)) for d in docs]                    # handler
+        validated = adapter.validate_python(returned, from_attributes=True)           # response_model
+        return JSONResponse(adapter.dump_python(validated, mode="json", by_alias=True)).body
+
+    return run
+
+
+def _time(fn: Callable[[], Any], rounds: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    datasets = {
+        "citas+usuario": (_appointments(args.items), _fastapi_path(AppointmentWithUserResponse, lambda d: d)),
+        "reseñas": (_reviews(args.items), _fastapi_path(ReviewResponse, _normalize_review_doc)),
+    }
+    print(f"{args.items} documentos, {args.rounds} rondas")
+    for name, (docs, legacy) in datasets.items():
+        before = _time(lambda: legacy(docs), args.rounds)
+        after = _time(lambda: MongoJSONResponse(docs).body, args.rounds)
+        print(
+            f"{name:>14}: anterior {before * 1000:7.2f} ms  MongoJSONResponse {after * 1000:6.2f} ms"
+            f"  ({before / after:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Presupuesto de comandos Mongo por endpoint de escritura.
+
+Un CommandListener cuenta los comandos que manda cada endpoint y cada test
+falla si su endpoint supera el presupuesto (p. ej. si vuelve un find_one
+después de un update). Necesita un MongoDB real indicado en TEST_MONGO_URL
+(nunca se usa DATABASE_URL); crea y borra una base temporal, y se saltea si
+la variable no está definida o el servidor no responde:
+
+    TEST_MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_command_budget.py
+
+Solo se aceptan servidores locales. Para apuntar a otro host hay que pedirlo
+explícitamente con TEST_MONGO_ALLOW_REMOTE=1.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from pymongo.uri_parser import parse_uri
+
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.db.session import get_database
+from app.main import app
+from app.schemas.user import UserResponse
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL", "")
+if not MONGO_URL:
+    pytest.skip("TEST_MONGO_URL no está definida", allow_module_level=True)
+
+
+def _is_local(url: str) -> bool:
+    if not url.startswith("mongodb://"):
+        return False  # mongodb+srv:// siempre resuelve a un cluster remoto
+    try:
+        nodes = parse_uri(url)["nodelist"]
+    except (PyMongoError, ValueError):
+        return False
+    return bool(nodes) and all(host in LOCAL_HOSTS for host, _ in nodes)
+
+
+if not _is_local(MONGO_URL) and os.environ.get("TEST_MONGO_ALLOW_REMOTE") != "1":
+    pytest.skip(
+        "TEST_MONGO_URL no apunta a localhost; definir TEST_MONGO_ALLOW_REMOTE=1 para usar otro servidor",
+        allow_module_level=True,
+    )
+
+# Comandos que no son de la aplicación (handshake, sesiones, autenticación).
+IGNORED = {"hello", "ismaster", "isMaster", "endSessions", "saslStart", "saslContinue", "ping"}
+
+# (nombre, presupuesto de comandos). El orden importa: cada paso usa lo que dejó el anterior.
+BUDGETS: Dict[str, int] = {
+    "POST /businesses/my-business": 1,                       # insert
+    "PUT /businesses/my-business/{id}": 2,                   # find (permiso) + findAndModify
+    "PUT /businesses/my-business/{id}/schedule": 2,          # find (permiso) + findAndModify
+    "POST /businesses/my-business/{id}/publish": 2,          # find (permiso) + findAndModify
+    "POST /employees/businesses/{id}/employees": 1,          # insert
+    "PATCH /employees/employees/{id}": 1,                    # findAndModify
+    "PUT /employees/employees/{id}/allowed-slots": 1,        # findAndModify
+    "PUT /users/me": 1,                                      # findAndModify
+    "POST /users/me/request-owner": 1,                       # findAndModify
+    "POST /appointments/ (primer turno)": 4,                 # findAndModify + aggregate + insert contador + insert
+    "POST /appointments/ (turno ya sembrado)": 2,            # findAndModify contador + insert
+    "POST /appointments/{id}/cancel": 5,                     # find + findAndModify + update contador + find negocio + insert outbox
+}
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self) -> None:
+        self.commands: List[str] = []
+
+    def reset(self) -> None:
+        self.commands = []
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name not in IGNORED:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+async def run_scenarios(db: AsyncIOMotorDatabase, counter: CommandCounter) -> List[Tuple[str, List[str]]]:
+    """Ejecuta los endpoints en orden y devuelve (nombre, comandos) de cada uno."""
+    user = {"email": "presupuesto@example.com", "role": "usuario", "created_at": datetime.utcnow()}
+    user["_id"] = (await db.users.insert_one(user)).inserted_id
+    current = UserResponse.model_validate(user)
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: current
+
+    results: List[Tuple[str, List[str]]] = []
+    day = {"is_active": True, "open_time": "09:00", "close_time": "17:00", "slot_duration_minutes": 30, "capacity_per_slot": 2}
+    slot = (datetime.utcnow() + timedelta(days=7)).replace(hour=10, minute=0, second=0, microsecond=0)
+    ids: Dict[str, str] = {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://local/api") as client:
+
+        async def call(name: str, request: Callable[[], Awaitable[httpx.Response]]) -> Dict[str, Any]:
+            counter.reset()
+            response = await request()
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+            results.append((name, list(counter.commands)))
+            return response.json() if response.content else {}
+
+        business = await call("POST /businesses/my-business", lambda: client.post(
+            "/businesses/my-business",
+            json={"name": "Presupuesto", "description": "Negocio de prueba de comandos", "address": "Calle 123"},
+        ))
+        ids["business"] = business.get("id") or business["_id"]
+        await call("PUT /businesses/my-business/{id}", lambda: client.put(
+            f"/businesses/my-business/{ids['business']}", json={"name": "Presupuesto 2"}
+        ))
+        await call("PUT /businesses/my-business/{id}/schedule", lambda: client.put(
+            f"/businesses/my-business/{ids['business']}/schedule",
+            json={d: day for d in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")},
+        ))
+        await call("POST /businesses/my-business/{id}/publish", lambda: client.post(
+            f"/businesses/my-business/{ids['business']}/publish"
+        ))
+        employee = await call("POST /employees/businesses/{id}/employees", lambda: client.post(
+            f"/employees/businesses/{ids['business']}/employees", json={"name": "Ana"}
+        ))
+        ids["employee"] = employee["id"]
+        await call("PATCH /employees/employees/{id}", lambda: client.patch(
+            f"/employees/employees/{ids['employee']}", json={"name": "Ana María"}
+        ))
+        await call("PUT /employees/employees/{id}/allowed-slots", lambda: client.put(
+            f"/employees/employees/{ids['employee']}/allowed-slots", json={"allowed_slots": {"monday": ["10:00"]}}
+        ))
+        await call("PUT /users/me", lambda: client.put("/users/me", json={"full_name": "Cliente Presupuesto"}))
+        await call("POST /users/me/request-owner", lambda: client.post(
+            "/users/me/request-owner",
+            json={"business_name": "Otro", "business_description": "Descripción", "address": "Calle 456"},
+        ))
+        booking = {"business_id": ids["business"], "appointment_time": slot.isoformat()}
+        appointment = await call("POST /appointments/ (primer turno)", lambda: client.post("/appointments/", json=booking))
+        await call("POST /appointments/ (turno ya sembrado)", lambda: client.post("/appointments/", json=booking))
+        await call("POST /appointments/{id}/cancel", lambda: client.post(
+            f"/appointments/{appointment.get('id') or appointment['_id']}/cancel"
+        ))
+
+    app.dependency_overrides.clear()
+    return results
+
+
+async def _collect(url: str) -> Optional[Dict[str, List[str]]]:
+    """Corre los escenarios en una base temporal; None si no hay MongoDB disponible."""
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(url, event_listeners=[counter], serverSelectionTimeoutMS=2000)
+    name = f"{settings.DATABASE_NAME}_command_budget"
+    try:
+        try:
+            await client.admin.command("ping")
+        except PyMongoError:
+            return None
+        await client.drop_database(name)
+        try:
+            return dict(await run_scenarios(client[name], counter))
+        finally:
+            await client.drop_database(name)
+    finally:
+        client.close()
+
+
+@pytest.fixture(scope="module")
+def command_log() -> Dict[str, List[str]]:
+    # los escenarios dependen unos de otros: se ejecutan todos una vez y cada test revisa el suyo
+    log = asyncio.run(_collect(MONGO_URL))
+    if log is None:
+        pytest.skip(f"MongoDB no disponible en {MONGO_URL}")
+    return log
+
+
+@pytest.mark.parametrize("endpoint", list(BUDGETS))
+def test_command_budget(command_log: Dict[str, List[str]], endpoint: str) -> None:
+    commands = command_log[endpoint]
+    assert len(commands) <= BUDGETS[endpoint], (
+        f"{endpoint}: {len(commands)} comandos, presupuesto {BUDGETS[endpoint]} ({', '.join(commands)})"
+    )
@@ -0,0 +1,143 @@
+"""
+Capacidad de los turnos cuando un negocio mezcla citas genéricas y con
+empleado: toda reserva ocupa el contador del negocio, así que la suma nunca
+supera capacity_per_slot, y la disponibilidad informa lo mismo que los
+contadores. Corre sobre mongomock (sin servidor).
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from bson import ObjectId
+
+from app.crud import crud_appointment, crud_business, crud_slot_counter
+from app.crud.crud_slot_counter import SlotFullError
+
+DAY = {"is_active": True, "open_time": "09:00", "close_time": "12:00", "slot_duration_minutes": 60, "capacity_per_slot": 2}
+
+
+def _run(scenario: Callable[[Any, Dict[str, str], datetime], Awaitable[None]]) -> None:
+    async def main() -> None:
+        db = mongomock_motor.AsyncMongoMockClient()["slot_capacity"]
+        business_id = ObjectId()
+        await db.businesses.insert_one({
+            "_id": business_id,
+            "name": "Mixto",
+            "schedule": {d: DAY for d in crud_business.WEEKDAYS},
+        })
+        ids = {"business": str(business_id)}
+        for name in ("ana", "beto"):
+            res = await db.employees.insert_one({
+                "business_id": business_id,
+                "name": name,
+                "active": True,
+                "allowed_slots": {d: ["10:00"] for d in crud_business.WEEKDAYS},
+            })
+            ids[name] = str(res.inserted_id)
+        slot = (datetime.utcnow() + timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+        await scenario(db, ids, slot)
+
+    asyncio.run(main())
+
+
+async def _book(db: Any, ids: Dict[str, str], slot: datetime, employee: str = "") -> Dict[str, Any]:
+    return await crud_appointment.create(
+        db,
+        business_id=ids["business"],
+        user_id=str(ObjectId()),
+        appointment_time=slot,
+        employee_id=ids[employee] if employee else None,
+    )
+
+
+async def _generic_available(db: Any, ids: Dict[str, str], slot: datetime) -> bool:
+    free = await crud_business.get_available_slots_for_day(db, ids["business"], slot.strftime("%Y-%m-%d"))
+    return slot.strftime("%H:%M") in free
+
+
+async def _employee_available(db: Any, ids: Dict[str, str], slot: datetime, employee: str) -> bool:
+    free = await crud_business.get_available_slots_for_day(
+        db, ids["business"], slot.strftime("%Y-%m-%d"), employee_id=ids[employee]
+    )
+    return slot.strftime("%H:%M") in free
+
+
+def test_employee_bookings_use_business_capacity() -> None:
+    async def scenario(db: Any, ids: Dict[str, str], slot: datetime) -> None:
+        await _book(db, ids, slot, "ana")
+        await _book(db, ids, slot)
+        # capacidad 2 ya ocupada por una cita de empleado y una genérica
+        assert not await _generic_available(db, ids, slot)
+        assert not await _employee_available(db, ids, slot, "beto")
+        with pytest.raises(SlotFullError):
+            await _book(db, ids, slot, "beto")
+        with pytest.raises(SlotFullError):
+            await _book(db, ids, slot)
+        assert await db.appointments.count_documents({"status": "confirmed"}) == 2
+
+    _run(scenario)
+
+
+def test_generic_bookings_block_employee_slots() -> None:
+    async def scenario(db: Any, ids: Dict[str, str], slot: datetime) -> None:
+        await _book(db, ids, slot)
+        await _book(db, ids, slot)
+        assert not await _employee_available(db, ids, slot, "ana")
+        with pytest.raises(SlotFullError):
+            await _book(db, ids, slot, "ana")
+
+    _run(scenario)
+
+
+def test_employee_capacity_is_one() -> None:
+    async def scenario(db: Any, ids: Dict[str, str], slot: datetime) -> None:
+        await _book(db, ids, slot, "ana")
+        assert not await _employee_available(db, ids, slot, "ana")
+        assert await _employee_available(db, ids, slot, "beto")
+        assert await _generic_available(db, ids, slot)
+        with pytest.raises(SlotFullError):
+            await _book(db, ids, slot, "ana")
+
+    _run(scenario)
+
+
+def test_cancel_and_reconfirm() -> None:
+    async def scenario(db: Any, ids: Dict[str, str], slot: datetime) -> None:
+        first = await _book(db, ids, slot, "ana")
+        await _book(db, ids, slot)
+        await crud_appointment.update_status(db, str(first["_id"]), None, "cancelled")
+        assert await _employee_available(db, ids, slot, "ana")
+        await _book(db, ids, slot, "beto")
+        # el lugar liberado ya lo tomó otra cita: no se puede volver a confirmar
+        with pytest.raises(SlotFullError):
+            await crud_appointment.update_status(db, str(first["_id"]), None, "confirmed")
+        assert (await db.appointments.find_one({"_id": first["_id"]}))["status"] == "cancelled"
+
+        await crud_appointment.update_status(db, str(first["_id"]), None, "cancelled")
+        other = await db.appointments.find_one({"employee_id": ObjectId(ids["beto"])})
+        await crud_appointment.update_status(db, str(other["_id"]), None, "cancelled")
+        again = await crud_appointment.update_status(db, str(first["_id"]), None, "confirmed")
+        assert again["status"] == "confirmed"
+        assert not await _employee_available(db, ids, slot, "ana")
+        counters = {
+            str(c["employee_id"]): c["count"] async for c in db.slot_counters.find({"slot": slot})
+        }
+        assert counters == {"None": 2, ids["ana"]: 1, ids["beto"]: 0}
+
+    _run(scenario)
+
+
+def test_sync_business_counters_counts_employee_bookings() -> None:
+    async def scenario(db: Any, ids: Dict[str, str], slot: datetime) -> None:
+        await _book(db, ids, slot, "ana")
+        # contador del negocio como quedaba antes: sin la cita del empleado
+        await db.slot_counters.update_one({"employee_id": None, "slot": slot}, {"$set": {"count": 0}})
+        assert await crud_slot_counter.sync_business_counters(db) == 1
+        assert (await db.slot_counters.find_one({"employee_id": None, "slot": slot}))["count"] == 1
+        assert await crud_slot_counter.sync_business_counters(db) == 0
+
+    _run(scenario)
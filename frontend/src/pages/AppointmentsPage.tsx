@@ -1,8 +1,8 @@
 
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '@/hooks/useAuth';
-import { API_BASE_URL } from '@/services/api';
-import { Appointment, Business } from '@/types';
+import { API_BASE_URL, HttpError, fetchAllPages } from '@/services/api';
+import { Appointment } from '@/types';
 
 import {
   Box, Typography, Paper, CircularProgress, Alert, Stack, Divider, Button,
@@ -121,7 +121,7 @@ function getVisualStatus(a: Appointment): { label: string; color: 'default' | 's
 
 const AppointmentCard: React.FC<{
   appointment: Appointment;
-  business?: Business;
+  business?: Appointment['business'];
   onCancelled: (a: Appointment) => void;
 }> = ({ appointment, business, onCancelled }) => {
   const { token } = useAuth();
@@ -233,7 +233,6 @@ const AppointmentCard: React.FC<{
 export const AppointmentsPage: React.FC = () => {
   const { token, logout } = useAuth();
   const [appointments, setAppointments] = useState<Appointment[]>([]);
-  const [businesses, setBusinesses] = useState<Record<string, Business>>({});
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -245,28 +244,17 @@ export const AppointmentsPage: React.FC = () => {
         return;
       }
       try {
-        const r = await fetch(`${API_BASE_URL}/appointments/me`, {
-          headers: { 'Authorization': `Bearer ${token}` },
-        });
-        if (!r.ok) {
-          if (r.status === 401) logout();
-          throw new Error("No se pudieron cargar tus citas.");
-        }
-        const data: Appointment[] = await r.json();
-        setAppointments(data);
-
-        const rb = await fetch(`${API_BASE_URL}/businesses/`);
-        if (rb.ok) {
-          const list: Business[] = await rb.json();
-          const map = list.reduce((acc, b) => {
-            const key = (b as any).id || (b as any)._id;
-            if (key) acc[key] = b;
-            return acc;
-          }, {} as Record<string, Business>);
-          setBusinesses(map);
-        }
+        // próximas (de la más cercana en adelante) y luego pasadas (de la más reciente hacia atrás),
+        // siguiendo todas las páginas para no perder ninguna
+        const init = { headers: { 'Authorization': `Bearer ${token}` } };
+        const [upcoming, past] = await Promise.all([
+          fetchAllPages<Appointment>(`${API_BASE_URL}/appointments/me?expand=business&when=upcoming`, init),
+          fetchAllPages<Appointment>(`${API_BASE_URL}/appointments/me?expand=business&when=past`, init),
+        ]);
+        setAppointments([...upcoming, ...past]);
       } catch (e: any) {
-        setError(e.message);
+        if (e instanceof HttpError && e.status === 401) logout();
+        setError("No se pudieron cargar tus citas.");
       } finally {
         setIsLoading(false);
       }
@@ -276,7 +264,8 @@ export const AppointmentsPage: React.FC = () => {
 
   const handleCancelled = (updated: Appointment) => {
     const id = getApptId(updated);
-    setAppointments(prev => prev.map(a => (getApptId(a) === id ? updated : a)));
+    // la respuesta de cancelar no trae el negocio expandido
+    setAppointments(prev => prev.map(a => (getApptId(a) === id ? { ...a, ...updated } : a)));
   };
 
   if (isLoading) return <Box sx={{ textAlign: 'center', p: 4 }}><CircularProgress /></Box>;
@@ -292,7 +281,7 @@ export const AppointmentsPage: React.FC = () => {
             <AppointmentCard
               key={getApptId(a)}
               appointment={a}
-              business={businesses[a.business_id]}
+              business={a.business}
               onCancelled={handleCancelled}
             />
           ))}
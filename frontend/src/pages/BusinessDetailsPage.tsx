@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useCallback, useMemo } from 'react';
-import { API_BASE_URL } from '@/services/api';
+import { API_BASE_URL, fetchAllPages } from '@/services/api';
 import { Business, Appointment, Employee } from '@/types';
 import { useAuth } from '@/hooks/useAuth';
 import { ExtendedPage } from '@/App';
@@ -40,6 +40,7 @@ type Review = {
   comment: string;
   created_at: string;
   reply?: ReviewReply;
+  author?: UserLite | null;
 };
 
 type UserLite = {
@@ -369,7 +370,7 @@ const ReviewsSection: React.FC<{
     } catch {  }
 
     try {
-      const myApps: any[] = await fetchJSON(`${API_BASE_URL}/appointments/me`, {
+      const myApps: any[] = await fetchAllPages<any>(`${API_BASE_URL}/appointments/me?when=past`, {
         headers: { Authorization: `Bearer ${token}` },
       });
       const now = Date.now();
@@ -398,20 +399,11 @@ const ReviewsSection: React.FC<{
     setLoading(true);
     setError('');
     try {
-      const data: Review[] = await fetchJSON(REVIEWS_LIST_URL);
+      const data: Review[] = await fetchJSON(`${REVIEWS_LIST_URL}?expand=author`);
       setReviews(data);
 
-      const uniqUserIds = Array.from(new Set(data.map(d => d.user_id)));
       const entries: Record<string, UserLite> = {};
-      await Promise.all(uniqUserIds.map(async (uid) => {
-        try {
-          const ru = await fetch(`${API_BASE_URL}/users/${uid}`);
-          if (ru.ok) {
-            const u = await ru.json();
-            entries[uid] = u as UserLite; 
-          }
-        } catch {  }
-      }));
+      data.forEach(d => { if (d.author) entries[d.user_id] = d.author; });
       setUsersMap(entries);
     } catch (e: any) {
       setError(e.message);
@@ -618,11 +610,9 @@ export const BusinessDetailsPage: React.FC<BusinessDetailsPageProps> = ({ busine
         const bizId = bizIdOf(business);
         if (!bizId) { setCanReview(false); return; }
 
-        const res = await fetch(`${API_BASE_URL}/appointments/me`, {
+        const myApps = await fetchAllPages<Appointment>(`${API_BASE_URL}/appointments/me?when=past`, {
           headers: { Authorization: `Bearer ${token}` },
         });
-        if (!res.ok) { setCanReview(false); return; }
-        const myApps: Appointment[] = await res.json();
 
         const now = Date.now();
         const eligible = myApps.some(a =>
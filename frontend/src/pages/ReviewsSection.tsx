@@ -1,5 +1,5 @@
 import { useEffect, useMemo, useState, useCallback } from 'react';
-import { API_BASE_URL } from '@/services/api';
+import { API_BASE_URL, fetchAllPages } from '@/services/api';
 import { useAuth } from '@/hooks/useAuth';
 import {
   Box,
@@ -32,6 +32,7 @@ type Review = {
   comment: string;
   created_at: string;
   reply?: ReviewReply;
+  author?: UserLite | null;
 };
 
 type UserLite = {
@@ -95,7 +96,7 @@ export default function ReviewsSection({ businessId }: { businessId: string }) {
   const REVIEWS_LIST_URL = `${API_BASE_URL}/reviews/business/${businessId}`;
   const REVIEWS_CREATE_URL = `${API_BASE_URL}/reviews/`;
   const ELIGIBILITY_URL = `${API_BASE_URL}/reviews/eligibility/${businessId}`;
-  const MY_APPTS_URL = `${API_BASE_URL}/appointments/me`;
+  const MY_APPTS_URL = `${API_BASE_URL}/appointments/me?when=past`;
 
   const resolveAppointmentId = useCallback(async (): Promise<string | null> => {
     if (!token) return null;
@@ -113,7 +114,7 @@ export default function ReviewsSection({ businessId }: { businessId: string }) {
     }
 
     try {
-      const myApps: any[] = await fetchJSON(MY_APPTS_URL, {
+      const myApps: any[] = await fetchAllPages<any>(MY_APPTS_URL, {
         headers: headersWithAuth(token),
       });
       const now = Date.now();
@@ -151,17 +152,11 @@ export default function ReviewsSection({ businessId }: { businessId: string }) {
     setLoading(true);
     setError('');
     try {
-      const data = await fetchJSON<Review[]>(REVIEWS_LIST_URL);
+      const data = await fetchJSON<Review[]>(`${REVIEWS_LIST_URL}?expand=author`);
       setReviews(data);
 
-      const uniqUserIds = Array.from(new Set(data.map(d => d.user_id)));
       const entries: Record<string, UserLite> = {};
-      await Promise.all(uniqUserIds.map(async (uid) => {
-        try {
-          const ru = await fetch(`${API_BASE_URL}/users/${uid}`);
-          if (ru.ok) entries[uid] = await ru.json();
-        } catch {  }
-      }));
+      data.forEach(d => { if (d.author) entries[d.user_id] = d.author; });
       setUsersMap(entries);
     } catch (e: any) {
       setError(e.message);
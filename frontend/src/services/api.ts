@@ -1,3 +1,28 @@
+export const API_BASE_URL = "http://127.0.0.1:8000/api";
 
+export class HttpError extends Error {
+  status: number;
+  constructor(status: number, message: string) {
+    super(message);
+    this.status = status;
+  }
+}
 
-export const API_BASE_URL = "http://127.0.0.1:8000/api";
\ No newline at end of file
+// Pide todas las páginas de un listado con cursor: sigue el header X-Next-Cursor
+// hasta que el backend deja de enviarlo y devuelve los elementos concatenados.
+export async function fetchAllPages<T>(url: string, init?: RequestInit): Promise<T[]> {
+  const items: T[] = [];
+  const sep = url.includes('?') ? '&' : '?';
+  let cursor: string | null = null;
+  do {
+    const pageUrl: string = cursor ? `${url}${sep}cursor=${encodeURIComponent(cursor)}` : url;
+    const res = await fetch(pageUrl, init);
+    if (!res.ok) {
+      const data = await res.json().catch(() => ({}));
+      throw new HttpError(res.status, typeof data?.detail === 'string' ? data.detail : 'Error al cargar los datos.');
+    }
+    items.push(...((await res.json()) as T[]));
+    cursor = res.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return items;
+}
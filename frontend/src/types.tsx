@@ -37,6 +37,9 @@ export interface Appointment {
   appointment_time: string;
   status: 'confirmed' | 'cancelled';
   employee_id?: string | null;
+  // solo con /appointments/me?expand=business,employee
+  business?: Pick<Business, 'id' | '_id' | 'name' | 'address' | 'categories'> | null;
+  employee?: { _id: string; name?: string } | null;
 }
 
 export type Category = { id?: string; _id?: string; name: string };